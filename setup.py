@@ -1,3 +1,5 @@
+import os
+
 from setuptools import setup
 
 def local_scheme(_):
@@ -7,7 +9,25 @@ def local_scheme(_):
      """
     return ""
 
+def ext_modules():
+    """Optionally compiles the interface parser and the modules on the per call path to C extensions.
+
+    Set VARLINK_SPEEDUPS=1 to build them with Cython. The pure python modules are installed
+    nevertheless and used, if the extensions are not available.
+    """
+    if os.environ.get("VARLINK_SPEEDUPS") != "1":
+        return []
+
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        raise SystemExit("VARLINK_SPEEDUPS=1 needs Cython to build the extensions, "
+                         "install it first and build with pip --no-build-isolation")
+
+    return cythonize(["varlink/client.py", "varlink/error.py", "varlink/scanner.py"], compiler_directives={"language_level": 3})
+
 setup(
     use_scm_version={"local_scheme": "no-local-version"},
     setup_requires=['setuptools_scm'],
+    ext_modules=ext_modules(),
 )
@@ -17,14 +17,14 @@ import os
 
 if hasattr(os, "fork"):
     __all__ = ['Client', 'ClientInterfaceHandler', 'SimpleClientInterfaceHandler',
-               'Service', 'RequestHandler', 'Server', 'ThreadingServer', 'ForkingServer',
+               'Service', 'RequestHandler', 'Server', 'ThreadingServer', 'ForkingServer', 'AsyncServer',
                'InterfaceNotFound', 'MethodNotFound', 'MethodNotImplemented', 'InvalidParameter',
                'ConnectionError', 'VarlinkEncoder', 'VarlinkError',
                'Interface', 'Scanner', 'get_listen_fd']
     from .server import ForkingServer
 else:
     __all__ = ['Client', 'ClientInterfaceHandler', 'SimpleClientInterfaceHandler',
-               'Service', 'RequestHandler', 'Server', 'ThreadingServer',
+               'Service', 'RequestHandler', 'Server', 'ThreadingServer', 'AsyncServer',
                'InterfaceNotFound', 'MethodNotFound', 'MethodNotImplemented', 'InvalidParameter',
                'ConnectionError', 'VarlinkEncoder', 'VarlinkError',
                'Interface', 'Scanner', 'get_listen_fd']
@@ -33,7 +33,7 @@ from .client import (Client, ClientInterfaceHandler, SimpleClientInterfaceHandle
 from .error import (VarlinkEncoder, VarlinkError, InvalidParameter, InterfaceNotFound, MethodNotImplemented,
                     MethodNotFound, ConnectionError, BrokenPipeError)
 from .scanner import (Scanner, Interface)
-from .server import (Service, get_listen_fd, Server, ThreadingServer, RequestHandler)
+from .server import (Service, get_listen_fd, Server, ThreadingServer, AsyncServer, RequestHandler)
 
 
 # There are no tests here, so don't try to run anything discovered from
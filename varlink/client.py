@@ -3,6 +3,8 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
+import errno
 import json
 import os
 import shutil
@@ -36,6 +38,26 @@ class ConnectionError(OSError):
     pass
 
 
+_builtin_interface = None
+_builtin_interface_lock = threading.Lock()
+
+
+def _get_builtin_interface():
+    """Returns the parsed org.varlink.service interface, which every Client needs.
+
+    The interface definition is static, so it is only read and parsed once per process.
+    """
+    global _builtin_interface
+
+    if _builtin_interface is None:
+        with _builtin_interface_lock:
+            if _builtin_interface is None:
+                with open(os.path.join(os.path.dirname(__file__), 'org.varlink.service.varlink')) as f:
+                    _builtin_interface = Interface(f.read())
+
+    return _builtin_interface
+
+
 class ClientInterfaceHandler(object):
     """Base class for varlink client, which wraps varlink methods of an interface to the class"""
 
@@ -57,6 +79,9 @@ class ClientInterfaceHandler(object):
         self._interface = interface
         self._namespaced = namespaced
         self._in_use = False
+        # a call was sent, whose last reply has not been read yet
+        self._pending = False
+        self._envelopes = {}
 
         for member in interface.members.values():
             if isinstance(member, _Method):
@@ -81,6 +106,12 @@ class ClientInterfaceHandler(object):
         raise NotImplementedError
 
     def _add_method(self, method):
+        # The message envelope only differs in the parameters, so serialize the constant
+        # part once per method: plain call, oneway call and call with more
+        full_name = json.dumps(self._interface.name + "." + method.name)
+        self._envelopes[method.name] = tuple(
+            ('{"method": ' + full_name + flags).encode('utf-8')
+            for flags in ('', ', "oneway": true', ', "more": true'))
 
         def _wrapped(*args, **kwargs):
             if "_more" in kwargs and kwargs.pop("_more"):
@@ -94,13 +125,14 @@ class ClientInterfaceHandler(object):
             _wrapped.__name__ = method.name.encode("latin-1")
 
         # FIXME: add comments
-        if method.signature:
+        signature = method.signature
+        if signature:
             if method.doc:
                 _wrapped.__doc__ = method.doc + "\n"
             else:
                 _wrapped.__doc__ = ""
                 "\n"
-            _wrapped.__doc__ += method.signature
+            _wrapped.__doc__ += signature
         setattr(self, method.name, _wrapped)
 
     def _next_varlink_message(self):
@@ -112,6 +144,7 @@ class ClientInterfaceHandler(object):
 
         if 'error' in message and message["error"] != None:
             self._in_use = False
+            self._pending = False
             e = VarlinkError.new(message, self._namespaced)
             raise e
         else:
@@ -129,17 +162,17 @@ class ClientInterfaceHandler(object):
 
         parameters = self._interface.filter_params("client.call", method.in_type, False, args, kwargs)
 
-        out = {'method': self._interface.name + "." + method_name}
-
-        if oneway:
-            out['oneway'] = True
+        envelope = self._envelopes[method_name][1 if oneway else 0]
 
+        self._pending = True
         if parameters:
-            out['parameters'] = parameters
-
-        self._send_message(json.dumps(out, cls=VarlinkEncoder).encode('utf-8'))
+            self._send_message(envelope + b', "parameters": ' +
+                               json.dumps(parameters, cls=VarlinkEncoder).encode('utf-8') + b'}')
+        else:
+            self._send_message(envelope + b'}')
 
         if oneway:
+            self._pending = False
             return None
 
         self._in_use = True
@@ -149,6 +182,7 @@ class ClientInterfaceHandler(object):
             self._in_use = False
             raise ConnectionError("Server indicated more varlink messages")
         self._in_use = False
+        self._pending = False
 
         if message:
             message = self._interface.filter_params("client.reply", method.out_type, self._namespaced, message, None)
@@ -162,9 +196,10 @@ class ClientInterfaceHandler(object):
         method = self._interface.get_method(method_name)
 
         parameters = self._interface.filter_params("client.call", method.in_type, False, args, kwargs)
-        out = {'method': self._interface.name + "." + method_name, 'more': True, 'parameters': parameters}
 
-        self._send_message(json.dumps(out, cls=VarlinkEncoder).encode('utf-8'))
+        self._pending = True
+        self._send_message(self._envelopes[method_name][2] + b', "parameters": ' +
+                           json.dumps(parameters, cls=VarlinkEncoder).encode('utf-8') + b'}')
 
         more = True
         self._in_use = True
@@ -175,12 +210,13 @@ class ClientInterfaceHandler(object):
                                                         None)
             yield message
         self._in_use = False
+        self._pending = False
 
 
 class SimpleClientInterfaceHandler(ClientInterfaceHandler):
     """A varlink client for an interface doing send/write and receive/read on a socket or file stream"""
 
-    def __init__(self, interface, file_or_socket, namespaced=False):
+    def __init__(self, interface, file_or_socket, namespaced=False, release=None):
         """Creates an object with the varlink methods of an interface installed.
 
         The object allows to talk to a varlink service, which implements the specified interface
@@ -191,10 +227,13 @@ class SimpleClientInterfaceHandler(ClientInterfaceHandler):
         :param interface: an Interface object
         :param file_or_socket: an open socket or io stream
         :param namespaced: if True, varlink methods return SimpleNamespace objects instead of dictionaries
+        :param release: if set, called with the connection on close() instead of closing it,
+                        as long as no method call is in progress or was interrupted
 
         """
         ClientInterfaceHandler.__init__(self, interface, namespaced=namespaced)
         self._connection = file_or_socket
+        self._release = release
 
         if hasattr(self._connection, 'send_bytes'):
             self._send_bytes = True
@@ -220,7 +259,8 @@ class SimpleClientInterfaceHandler(ClientInterfaceHandler):
             self._recv = False
             self._recv_bytes = False
 
-        self._in_buffer = b''
+        self._in_buffer = bytearray()
+        self._in_scanned = 0
 
     def __enter__(self):
         return self
@@ -229,6 +269,15 @@ class SimpleClientInterfaceHandler(ClientInterfaceHandler):
         self.close()
 
     def close(self):
+        if self._connection is None:
+            # already handed back with release()
+            return
+
+        if self._release and not self._pending and not self._in_use and not self._in_buffer:
+            connection, self._connection = self._connection, None
+            self._release(connection)
+            return
+
         try:
             if hasattr(self._connection, 'shutdown'):
                 self._connection.shutdown(socket.SHUT_RDWR)
@@ -242,21 +291,24 @@ class SimpleClientInterfaceHandler(ClientInterfaceHandler):
             self._connection.send_bytes(out + b'\0')
         elif self._sendall:
             self._connection.sendall(out + b'\0')
-        elif hasattr:
+        else:
             self._connection.write(out + b'\0')
 
     def _next_message(self):
         while True:
-            message, sep, self._in_buffer = self._in_buffer.partition(b'\0')
-            if not sep:
-                # No zero byte found
-                self._in_buffer = message
-                message = None
-
-            if message:
-                yield message.decode('utf-8')
+            end = self._in_buffer.find(b'\0', self._in_scanned)
+            if end != -1:
+                message = self._in_buffer[:end]
+                del self._in_buffer[:end + 1]
+                self._in_scanned = 0
+
+                if message:
+                    yield message.decode('utf-8')
                 continue
 
+            # No zero byte found, only scan the newly received data next time
+            self._in_scanned = len(self._in_buffer)
+
             if self._recv_bytes:
                 data = self._connection.recv_bytes(8192)
             elif self._recv:
@@ -269,6 +321,25 @@ class SimpleClientInterfaceHandler(ClientInterfaceHandler):
             self._in_buffer += data
 
 
+def _connection_is_idle(connection):
+    """Returns True, if the connection is neither closed by the peer nor has unread data."""
+    try:
+        # the caller may have given the connection a timeout
+        timeout = connection.gettimeout()
+        connection.setblocking(False)
+        try:
+            connection.recv(1, socket.MSG_PEEK)
+        finally:
+            connection.settimeout(timeout)
+    except socket.error as e:
+        return e.errno in (errno.EAGAIN, errno.EWOULDBLOCK)
+    except Exception:
+        return False
+
+    # either EOF or a message nobody asked for
+    return False
+
+
 def pipe_bridge(reader, writer):
     if hasattr(reader, "recv"):
         recv = True
@@ -297,7 +368,7 @@ def pipe_bridge(reader, writer):
         try:
             if sendall:
                 writer.sendall(data)
-            elif hasattr:
+            else:
                 writer.write(data)
                 writer.flush()
         except Exception as e:
@@ -358,26 +429,29 @@ class Client(object):
     """
     handler = SimpleClientInterfaceHandler
 
-    def __init__(self, address=None, resolve_interface=None, resolver=None):
+    def __init__(self, address=None, resolve_interface=None, resolver=None, pool_size=0):
         """Creates a Client object to reach the interfaces of a varlink service.
         For more constructors see the class constructor methods new_with_*() returning an Client object.
 
         :param address: the exact address like "unix:/run/org.varlink.resolver"
         :param resolve_interface: an interface name, which is resolved with the system wide resolver
         :param resolver: the exact address of the resolver to be used to resolve the interface name
+        :param pool_size: the number of idle connections kept open to be reused by open(),
+                          0 disables connection reuse
         :exception ConnectionError: could not connect to the service or resolver
 
         """
         self._interfaces = {}
         self._socket = None
         self._socket_fn = None
+        self._pool = collections.deque()
+        self._pool_size = pool_size
+        self._pool_lock = threading.Lock()
         self._tmpdir = None
         self._child_pid = 0
         self._str = "Client<uninitialized>"
 
-        with open(os.path.join(os.path.dirname(__file__), 'org.varlink.service.varlink')) as f:
-            interface = Interface(f.read())
-            self.add_interface(interface)
+        self.add_interface(_get_builtin_interface())
 
         if resolve_interface:
             self._with_interface(resolve_interface, resolver)
@@ -412,32 +486,35 @@ class Client(object):
         s.bind(address)
         s.listen(100)
 
-        self._child_pid = os.fork()
-        if self._child_pid == 0:
-            # child
-            n = s.fileno()
-            if n == 3:
-                # without dup() the socket is closed with the python destructor
-                n = os.dup(3)
-                del s
-            else:
-                try:
-                    os.close(3)
-                except OSError:
-                    pass
-
-            os.dup2(n, 3)
-            address = address.replace('\0', '@', 1)
-
-            for i in range(1, len(argv)):
-                argv[i] = argv[i].replace("$VARLINK_ADDRESS", "unix:" + address)
-
-            os.environ["VARLINK_ADDRESS"] = "unix:" + address
-            os.environ["LISTEN_FDS"] = "1"
-            os.environ["LISTEN_FDNAMES"] = "varlink"
-            os.environ["LISTEN_PID"] = str(os.getpid())
-            os.execvp(argv[0], argv)
-            sys.exit(1)
+        if hasattr(os, "posix_spawn"):
+            self._child_pid = self._spawn_activated(s, address, argv)
+        else:
+            self._child_pid = os.fork()
+            if self._child_pid == 0:
+                # child
+                n = s.fileno()
+                if n == 3:
+                    # without dup() the socket is closed with the python destructor
+                    n = os.dup(3)
+                    del s
+                else:
+                    try:
+                        os.close(3)
+                    except OSError:
+                        pass
+
+                os.dup2(n, 3)
+                address = address.replace('\0', '@', 1)
+
+                for i in range(1, len(argv)):
+                    argv[i] = argv[i].replace("$VARLINK_ADDRESS", "unix:" + address)
+
+                os.environ["VARLINK_ADDRESS"] = "unix:" + address
+                os.environ["LISTEN_FDS"] = "1"
+                os.environ["LISTEN_FDNAMES"] = "varlink"
+                os.environ["LISTEN_PID"] = str(os.getpid())
+                os.execvp(argv[0], argv)
+                sys.exit(1)
         # parent
         s.close()
 
@@ -445,6 +522,31 @@ class Client(object):
 
         return self
 
+    @staticmethod
+    def _spawn_activated(s, address, argv):
+        # Spawning does not duplicate the address space of the parent like fork() does.
+        # LISTEN_PID has to be the pid of the service, which is not known before it is
+        # spawned, so a shell sets it and exec()s the service in the same process.
+        n = s.fileno()
+        dup = None
+        if n == 3:
+            # dup2() onto the same file descriptor would keep the close-on-exec flag
+            n = dup = os.dup(3)
+
+        argv = [argv[0]] + [arg.replace("$VARLINK_ADDRESS", "unix:" + address) for arg in argv[1:]]
+
+        env = dict(os.environ)
+        env["VARLINK_ADDRESS"] = "unix:" + address
+        env["LISTEN_FDS"] = "1"
+        env["LISTEN_FDNAMES"] = "varlink"
+
+        try:
+            return os.posix_spawn("/bin/sh", ["/bin/sh", "-c", 'export LISTEN_PID=$$; exec "$0" "$@"'] + argv, env,
+                                  file_actions=[(os.POSIX_SPAWN_DUP2, n, 3)])
+        finally:
+            if dup is not None:
+                os.close(dup)
+
     @classmethod
     def new_with_bridge(cls, argv):
         """Creates a Client object to a varlink service started via the bridge command.
@@ -529,6 +631,8 @@ class Client(object):
             def open_tcp():
                 s = socket.create_connection((address, int(port)))
                 s.setblocking(True)
+                # the calls are small messages, which must not wait for the ACK of the previous one
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 return s
 
             self._socket_fn = open_tcp
@@ -582,6 +686,11 @@ class Client(object):
             except:
                 pass
 
+        if hasattr(self, "_pool"):
+            with self._pool_lock:
+                while self._pool:
+                    self._pool.pop().close()
+
     def open(self, interface_name, namespaced=False, connection=None):
         """Open a new connection and get a client interface handle with the varlink methods installed.
 
@@ -594,8 +703,11 @@ class Client(object):
 
         """
 
+        release = None
         if not connection:
             connection = self.open_connection()
+            if self._pool_size:
+                release = self._release_connection
 
         if interface_name not in self._interfaces:
             self.get_interface(interface_name, socket_connection=connection)
@@ -603,15 +715,34 @@ class Client(object):
         if interface_name not in self._interfaces:
             raise InterfaceNotFound(interface_name)
 
+        if release:
+            return self.handler(self._interfaces[interface_name], connection, namespaced=namespaced, release=release)
+
         return self.handler(self._interfaces[interface_name], connection, namespaced=namespaced)
 
     def open_connection(self):
         """Open a new connection and return the socket.
+        If the client was created with a pool_size, an idle connection from the pool is reused.
         :exception OSError: anything socket.connect() throws
 
         """
+        with self._pool_lock:
+            while self._pool:
+                connection = self._pool.pop()
+                if _connection_is_idle(connection):
+                    return connection
+                connection.close()
+
         return self._socket_fn()
 
+    def _release_connection(self, connection):
+        with self._pool_lock:
+            if len(self._pool) < self._pool_size:
+                self._pool.append(connection)
+                return
+
+        connection.close()
+
     def get_interfaces(self, socket_connection=None):
         """Returns the a list of Interface objects the service implements."""
         if not socket_connection:
@@ -625,7 +756,7 @@ class Client(object):
         self.info = _service.GetInfo()
 
         if close_socket:
-            socket_connection.close()
+            self._release_connection(socket_connection)
 
         return self.info['interfaces']
 
@@ -639,11 +770,11 @@ class Client(object):
         _service = self.handler(self._interfaces["org.varlink.service"], socket_connection)
         # noinspection PyUnresolvedReferences
         desc = _service.GetInterfaceDescription(interface_name)
-        interface = Interface(desc['description'])
+        interface = Interface.parse(desc['description'])
         self._interfaces[interface.name] = interface
 
         if close_socket:
-            socket_connection.close()
+            self._release_connection(socket_connection)
 
         return interface
 
@@ -33,31 +33,69 @@ class VarlinkEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, o)
 
 
+def _normalize(o):
+    """Converts o to the dictionaries, lists and values JSON decoding would return for it"""
+    if isinstance(o, dict):
+        return {k: _normalize(v) for (k, v) in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_normalize(v) for v in o]
+    if isinstance(o, set):
+        return {k: {} for k in o}
+    if isinstance(o, SimpleNamespace):
+        return _normalize(o.__dict__)
+    if isinstance(o, VarlinkError):
+        return _normalize(o.as_dict())
+    return o
+
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def _is_normalized(o):
+    """Returns whether o only consists of the dictionaries, lists and values JSON decoding returns"""
+    t = type(o)
+    if t is dict:
+        return all(_is_normalized(v) for v in o.values())
+    if t is list:
+        return all(_is_normalized(v) for v in o)
+    return t in _JSON_SCALARS
+
+
+def _to_namespace(o):
+    """Converts all dictionaries in o to SimpleNamespace objects"""
+    if isinstance(o, dict):
+        return SimpleNamespace(**{k: _to_namespace(v) for (k, v) in o.items()})
+    if isinstance(o, list):
+        return [_to_namespace(v) for v in o]
+    return o
+
+
+def _error_parameter(message, name):
+    """Returns a parameter of an error message, whose parameters are a dictionary or a SimpleNamespace"""
+    parameters = message.get('parameters')
+    if isinstance(parameters, dict):
+        return parameters.get(name)
+    return getattr(parameters, name, None)
+
+
 class VarlinkError(Exception):
     """The base class for varlink error exceptions"""
 
     @classmethod
     def new(cls, message, namespaced=False):
-        if message['error'] == 'org.varlink.service.InterfaceNotFound':
-            return InterfaceNotFound.new(message, namespaced)
-
-        elif message['error'] == 'org.varlink.service.InvalidParameter':
-            return InvalidParameter.new(message, namespaced)
-
-        elif message['error'] == 'org.varlink.service.MethodNotImplemented':
-            return MethodNotImplemented.new(message, namespaced)
+        error_class = _ERROR_CLASSES.get(message['error'])
+        if error_class is not None:
+            return error_class.new(message, namespaced)
 
-        elif message['error'] == 'org.varlink.service.MethodNotImplemented':
-            return MethodNotImplemented.new(message, namespaced)
-
-        else:
-            return cls(message, namespaced)
+        return cls(message, namespaced)
 
     def __init__(self, message, namespaced=False):
         if not namespaced and not isinstance(message, dict):
             raise TypeError
-        # normalize to dictionary
-        Exception.__init__(self, json.loads(json.dumps(message, cls=VarlinkEncoder)))
+        # normalize to dictionary, a message already consisting of plain JSON values is kept as it is
+        if not _is_normalized(message):
+            message = _normalize(message)
+        Exception.__init__(self, message)
 
     def error(self):
         """returns the exception varlink error name"""
@@ -66,7 +104,7 @@ class VarlinkError(Exception):
     def parameters(self, namespaced=False):
         """returns the exception varlink error parameters"""
         if namespaced:
-            return json.loads(json.dumps(self.args[0]['parameters']), object_hook=lambda d: SimpleNamespace(**d))
+            return _to_namespace(self.args[0].get('parameters'))
         else:
             return self.args[0].get('parameters')
 
@@ -79,7 +117,7 @@ class InterfaceNotFound(VarlinkError):
 
     @classmethod
     def new(cls, message, namespaced=False):
-        return cls(namespaced and message['parameters'].interface or message['parameters'].get('interface', None))
+        return cls(_error_parameter(message, 'interface'))
 
     def __init__(self, interface):
         VarlinkError.__init__(self, {'error': 'org.varlink.service.InterfaceNotFound',
@@ -91,7 +129,7 @@ class MethodNotFound(VarlinkError):
 
     @classmethod
     def new(cls, message, namespaced=False):
-        return cls(namespaced and message['parameters'].method or message['parameters'].get('method', None))
+        return cls(_error_parameter(message, 'method'))
 
     def __init__(self, method):
         VarlinkError.__init__(self, {'error': 'org.varlink.service.MethodNotFound', 'parameters': {'method': method}})
@@ -102,7 +140,7 @@ class MethodNotImplemented(VarlinkError):
 
     @classmethod
     def new(cls, message, namespaced=False):
-        return cls(namespaced and message['parameters'].method or message['parameters'].get('method', None))
+        return cls(_error_parameter(message, 'method'))
 
     def __init__(self, method):
         VarlinkError.__init__(self,
@@ -114,8 +152,16 @@ class InvalidParameter(VarlinkError):
 
     @classmethod
     def new(cls, message, namespaced=False):
-        return cls(namespaced and message['parameters'].parameter or message['parameters'].get('parameter', None))
+        return cls(_error_parameter(message, 'parameter'))
 
     def __init__(self, name):
         VarlinkError.__init__(self,
                               {'error': 'org.varlink.service.InvalidParameter', 'parameters': {'parameter': name}})
+
+
+_ERROR_CLASSES = {
+    'org.varlink.service.InterfaceNotFound': InterfaceNotFound,
+    'org.varlink.service.MethodNotFound': MethodNotFound,
+    'org.varlink.service.MethodNotImplemented': MethodNotImplemented,
+    'org.varlink.service.InvalidParameter': InvalidParameter,
+}
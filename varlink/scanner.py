@@ -1,85 +1,151 @@
 #!-*-coding:utf8-*-
-from __future__ import print_function
-from __future__ import unicode_literals
-
-try:
-    from builtins import str
-    from builtins import int
-    from builtins import object
-    from builtins import unicode
-except ImportError:
+import re
+import sys
+import threading
+from collections.abc import (Set, Mapping)
+from types import SimpleNamespace
+
+if sys.version_info >= (3, 7):
+    # plain dicts keep insertion order
+    _OrderedDict = dict
+else:
+    from collections import OrderedDict as _OrderedDict
+
+from .error import (MethodNotFound, InvalidParameter)
+
+
+# whitespace including comments, only used to find the name for a syntax error
+_WS_RE = re.compile(r'(?:[ \t\n]+|#[^\n]*)+', re.ASCII)
+# FIXME: nested ()
+_METHOD_SIG_RE = re.compile(r'([ \t\n]|#.*$)*(\([^)]*\))([ \t\n]|#.*$)*->([ \t\n]|#.*$)*(\([^)]*\))',
+                            re.ASCII | re.MULTILINE)
+
+# the characters whitespace and comments start with
+_WS_START = frozenset(" \t\n#")
+# keywords have to end at a word boundary, the punctuation tokens are compared directly
+_WORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+# only the whole match of the token patterns is used, so they have no capturing groups
+_PATTERNS = {
+    'interface-name': re.compile(r'[A-Za-z][A-Za-z]*(?:[.][A-Za-z0-9](?:-*[A-Za-z0-9])*)+'
+                                 r'|xn--[0-9a-z]*(?:[.][A-Za-z0-9](?:-*[A-Za-z0-9])*)+'),
+    'member-name': re.compile(r'\b[A-Z][A-Za-z0-9]*\b', re.ASCII),
+    'identifier': re.compile(r'\b[A-Za-z](?:_?[A-Za-z0-9])*\b', re.ASCII),
+}
+
+# the values standing for the primitive types in the type tree, shared by all parsed interfaces
+_PRIM_BOOL = bool()
+_PRIM_INT = int()
+_PRIM_FLOAT = float()
+_PRIM_STR = str()
+
+
+# the type keywords by their first character
+_TYPE_KEYWORDS = {'b': 'bool', 'i': 'int', 'f': 'float', 's': 'string', 'o': 'object'}
+_PRIMITIVE_TYPES = {'bool': _PRIM_BOOL, 'int': _PRIM_INT, 'float': _PRIM_FLOAT, 'string': _PRIM_STR}
+
+
+class _InvalidElement(Exception):
     pass
 
-import re
 
-try:
-    basestring
-except NameError:
-    basestring = str
+def _string_element(x):
+    if isinstance(x, str):
+        return x
+    raise _InvalidElement()
 
-try:
-    from types import SimpleNamespace
-except:  # Python 2
-    from argparse import Namespace as SimpleNamespace
 
-try:
-    from collections.abc import (Set, Mapping)
-except:  # Python 2
-    from collections import (Set, Mapping)
+def _float_element(x):
+    if isinstance(x, float) or isinstance(x, int):
+        return float(x)
+    raise _InvalidElement()
 
-from collections import OrderedDict
 
-from .error import (MethodNotFound, InvalidParameter)
+def _int_element(x):
+    if isinstance(x, float):
+        return int(round(x))
+    if isinstance(x, int):
+        return int(x)
+    raise _InvalidElement()
+
+
+def _bool_element(x):
+    if isinstance(x, bool):
+        return x
+    return _int_element(x)
+
+
+# the conversions of array elements of a primitive type, which do not need the filter dispatch
+_ELEMENT_FILTERS = {
+    type(_PRIM_STR): _string_element,
+    type(_PRIM_FLOAT): _float_element,
+    type(_PRIM_BOOL): _bool_element,
+    type(_PRIM_INT): _int_element,
+}
 
 
 class Scanner(object):
     """Class for scanning a varlink interface definition."""
 
     def __init__(self, string):
-        if hasattr(re, "ASCII"):
-            ASCII = re.ASCII
-        else:
-            ASCII = 0
-        self.whitespace = re.compile(r'([ \t\n]|#.*$)+', ASCII | re.MULTILINE)
-        self.docstring = re.compile(r'(?:.?)+#(.*)(?:\n|\r\n)')
-        # FIXME: nested ()
-        self.method_signature = re.compile(r'([ \t\n]|#.*$)*(\([^)]*\))([ \t\n]|#.*$)*->([ \t\n]|#.*$)*(\([^)]*\))',
-                                           ASCII | re.MULTILINE)
-
-        self.keyword_pattern = re.compile(r'\b[a-z]+\b|[:,(){}]|->|\[\]|\?|\[string\]\(\)|\[string\]', ASCII)
-        self.patterns = {
-            'interface-name': re.compile(r'[A-Za-z]([A-Za-z])*([.][A-Za-z0-9]([-]*[A-Za-z0-9])*)+|xn--([0-9a-z])*([.][A-Za-z0-9]([-]*[A-Za-z0-9])*)+'),
-            'member-name': re.compile(r'\b[A-Z][A-Za-z0-9]*\b', ASCII),
-            'identifier': re.compile(r'\b[A-Za-z]([_]?[A-Za-z0-9])*\b', ASCII),
-        }
-
         self.string = string
         self.pos = 0
-        self.current_doc = ""
+        self._doc_parts = []
+
+    @property
+    def current_doc(self):
+        """the doc comment lines collected since the last member"""
+        return "\n".join(self._doc_parts)
+
+    def _flush_doc(self):
+        doc = "\n".join(self._doc_parts)
+        del self._doc_parts[:]
+        return doc
+
+    def _skip_whitespace(self):
+        # skips the whitespace and comments at the current position and returns the new position,
+        # the gaps are mostly a single character, which a loop handles faster than a regex
+        string = self.string
+        pos = self.pos
+        length = len(string)
+        while pos < length:
+            c = string[pos]
+            if c == ' ' or c == '\t' or c == '\n':
+                pos += 1
+            elif c == '#':
+                end = string.find('\n', pos + 1)
+                if end == -1:
+                    # a comment without a newline at the end of the description is no doc comment
+                    pos = length
+                else:
+                    self._doc_parts.append(string[pos + 1:end])
+                    pos = end + 1
+            else:
+                break
+        self.pos = pos
+        return pos
 
     def get(self, expected):
-        m = self.whitespace.match(self.string, self.pos)
-        if m:
-            doc = self.docstring.findall(self.string[m.start():m.end()])
-            if len(doc):
-                try:
-                    self.current_doc += "\n".join(doc)
-                except UnicodeError:
-                    self.current_doc += "\n".join(
-                            [el.decode("utf-8") for el in doc])
-            self.pos = m.end()
-
-        pattern = self.patterns.get(expected)
+        string = self.string
+        pos = self.pos
+        # most tokens directly follow the previous one
+        if string[pos:pos + 1] in _WS_START:
+            pos = self._skip_whitespace()
+
+        pattern = _PATTERNS.get(expected)
         if pattern:
-            m = pattern.match(self.string, self.pos)
+            m = pattern.match(string, pos)
             if m:
                 self.pos = m.end()
                 return m.group(0)
-        else:
-            m = self.keyword_pattern.match(self.string, self.pos)
-            if m and m.group(0) == expected:
-                self.pos = m.end()
-                return True
+        elif string.startswith(expected, pos):
+            end = pos + len(expected)
+            if expected[0] in _WORD_CHARS:
+                if pos > 0 and string[pos - 1] in _WORD_CHARS:
+                    return None
+                if end < len(string) and string[end] in _WORD_CHARS:
+                    return None
+            self.pos = end
+            return True
 
     def expect(self, expected):
         value = self.get(expected)
@@ -88,69 +154,60 @@ class Scanner(object):
         return value
 
     def end(self):
-        m = self.whitespace.match(self.string, self.pos)
-        if m:
-            doc = self.docstring.findall(self.string[m.start():m.end()])
-            if len(doc):
-                try:
-                    self.current_doc += "\n".join(doc)
-                except UnicodeError:
-                    self.current_doc += "\n".join(
-                            [el.decode("utf-8") for el in doc])
-            self.pos = m.end()
-
-        return self.pos >= len(self.string)
+        return self._skip_whitespace() >= len(self.string)
 
     def read_type(self, lastmaybe=False):
-        if self.get('?'):
+        # only the tokens a type can start with at the next character are tried
+        pos = self._skip_whitespace()
+        c = self.string[pos:pos + 1]
+
+        if c == '?':
+            self.pos += 1
             if lastmaybe:
                 raise SyntaxError("double '??'")
             return _Maybe(self.read_type(lastmaybe=True))
 
-        if self.get('[string]()'):
-            return set()
+        if c == '[':
+            if self.get('[string]()'):
+                return set()
 
-        if self.get('[string]'):
-            return _Dict(self.read_type())
+            if self.get('[string]'):
+                return _Dict(self.read_type())
 
-        if self.get('[]'):
-            return _Array(self.read_type())
+            if self.get('[]'):
+                return _Array(self.read_type())
 
-        if self.get('object'):
-            return _Object()
+        keyword = _TYPE_KEYWORDS.get(c)
+        if keyword is not None and self.get(keyword):
+            if keyword == 'object':
+                return _Object()
+            return _PRIMITIVE_TYPES[keyword]
 
-        if self.get('bool'):
-            t = bool()
-        elif self.get('int'):
-            t = int()
-        elif self.get('float'):
-            t = float()
-        elif self.get('string'):
-            t = str()
-        else:
+        if c.isupper():
             name = self.get('member-name')
             if name:
-                t = _CustomType(name)
-            else:
-                t = self.read_struct()
+                return _CustomType(name)
 
-        return t
+        return self.read_struct()
 
     def read_struct(self):
+        get = self.get
+        expect = self.expect
+        read_type = self.read_type
         _isenum = None
-        self.expect('(')
-        fields = OrderedDict()
-        if not self.get(')'):
+        expect('(')
+        fields = _OrderedDict()
+        if not get(')'):
             while True:
-                name = self.expect('identifier')
+                name = expect('identifier')
                 if _isenum == None:
-                    if self.get(':'):
+                    if get(':'):
                         _isenum = False
-                        fields[name] = self.read_type()
-                        if not self.get(','):
+                        fields[name] = read_type()
+                        if not get(','):
                             break
                         continue
-                    elif self.get(','):
+                    elif get(','):
                         _isenum = True
                         fields[name] = True
                         continue
@@ -158,32 +215,36 @@ class Scanner(object):
                         raise SyntaxError("after '{}'".format(name))
                 elif not _isenum:
                     try:
-                        self.expect(':')
-                        fields[name] = self.read_type()
+                        expect(':')
+                        fields[name] = read_type()
                     except SyntaxError as e:
                         raise SyntaxError("after '{}': {}".format(name, e))
                 else:
                     fields[name] = True
 
-                if not self.get(','):
+                if not get(','):
                     break
-            self.expect(')')
+            expect(')')
         if _isenum:
-            return _Enum(fields.keys())
+            return _Enum(fields)
         else:
             return _Struct(fields)
 
     def read_member(self):
-        if self.get('type'):
+        # a member starts with one of three keywords, which differ in their first character
+        pos = self._skip_whitespace()
+        c = self.string[pos:pos + 1]
+
+        if c == 't' and self.get('type'):
             try:
                 _name = self.expect('member-name')
             except SyntaxError:
-                m = self.whitespace.match(self.string, self.pos)
+                m = _WS_RE.match(self.string, self.pos)
                 if m:
                     start = m.end()
                 else:
                     start = self.pos
-                m = self.whitespace.search(self.string, start)
+                m = _WS_RE.search(self.string, start)
                 if m:
                     stop = m.start()
                 else:
@@ -194,70 +255,80 @@ class Scanner(object):
                 _type = self.read_type()
             except SyntaxError as e:
                 raise SyntaxError("in '{}': {}".format(_name, e))
-            doc = self.current_doc
-            self.current_doc = ""
+            doc = self._flush_doc()
             return _Alias(_name, _type, doc)
-        elif self.get('method'):
+        elif c == 'm' and self.get('method'):
             name = self.expect('member-name')
-            # FIXME
-            sig = self.method_signature.match(self.string, self.pos)
-            if sig:
-                sig = name + sig.group(0)
+            signature_pos = self.pos
             in_type = self.read_struct()
             self.expect('->')
             out_type = self.read_struct()
-            doc = self.current_doc
-            self.current_doc = ""
-            return _Method(name, in_type, out_type, sig, doc)
-        elif self.get('error'):
-            doc = self.current_doc
-            self.current_doc = ""
+            doc = self._flush_doc()
+            return _Method(name, in_type, out_type, self.string, signature_pos, doc)
+        elif c == 'e' and self.get('error'):
+            doc = self._flush_doc()
             return _Error(self.expect('member-name'), self.read_type(), doc)
         else:
             raise SyntaxError('expected type, method, or error')
 
 
 class _Object(object):
-    pass
+    __slots__ = ()
 
 
 class _Struct(object):
+    __slots__ = ('fields', '_field_items', '_field_filters')
 
     def __init__(self, fields):
-        self.fields = OrderedDict(fields)
+        self.fields = fields
+        self._update_field_items()
+
+    def _update_field_items(self):
+        # iterated by filter_params for every value, with the interned name and the
+        # path component of the field
+        self._field_items = tuple((sys.intern(name), "." + name, field_type)
+                                  for (name, field_type) in self.fields.items())
+        self._field_filters = None
 
 
 class _Enum(object):
+    __slots__ = ('fields', '_values')
 
     def __init__(self, fields):
-        self.fields = fields
+        self.fields = tuple(fields)
+        self._values = frozenset(self.fields)
 
 
 class _Array(object):
+    __slots__ = ('element_type',)
 
     def __init__(self, element_type):
         self.element_type = element_type
 
 
 class _Maybe(object):
+    __slots__ = ('element_type',)
 
     def __init__(self, element_type):
         self.element_type = element_type
 
 
 class _Dict(object):
+    __slots__ = ('element_type',)
 
     def __init__(self, element_type):
         self.element_type = element_type
 
 
 class _CustomType(object):
+    __slots__ = ('name',)
 
     def __init__(self, name):
         self.name = name
 
 
 class _Alias(object):
+    __slots__ = ('name', 'type', 'doc')
 
     def __init__(self, name, varlink_type, doc=None):
         self.name = name
@@ -266,16 +337,35 @@ class _Alias(object):
 
 
 class _Method(object):
+    __slots__ = ('name', 'in_type', 'out_type', 'doc', '_description', '_signature_pos', '_signature')
 
-    def __init__(self, name, in_type, out_type, _signature, doc=None):
+    def __init__(self, name, in_type, out_type, description, signature_pos, doc=None):
         self.name = name
         self.in_type = in_type
         self.out_type = out_type
-        self.signature = _signature
         self.doc = doc
+        self._description = description
+        self._signature_pos = signature_pos
+
+    @property
+    def signature(self):
+        """the signature of the method as written in the interface description, matched on the first access"""
+        try:
+            return self._signature
+        except AttributeError:
+            pass
+
+        # FIXME
+        sig = _METHOD_SIG_RE.match(self._description, self._signature_pos)
+        if sig:
+            self._signature = self.name + sig.group(0)
+        else:
+            self._signature = None
+        return self._signature
 
 
 class _Error(object):
+    __slots__ = ('name', 'type', 'doc')
 
     def __init__(self, name, varlink_type, doc=None):
         self.name = name
@@ -283,6 +373,12 @@ class _Error(object):
         self.doc = doc
 
 
+# the interfaces parsed by Interface.parse(), by description
+_INTERFACE_CACHE_SIZE = 64
+_interface_cache = _OrderedDict()
+_interface_cache_lock = threading.Lock()
+
+
 class Interface(object):
     """Class for a parsed varlink interface definition."""
 
@@ -293,13 +389,97 @@ class Interface(object):
         scanner = Scanner(description)
         scanner.expect('interface')
         self.name = scanner.expect('interface-name')
-        self.doc = scanner.current_doc
-        scanner.current_doc = ""
-        self.members = OrderedDict()
+        self.doc = scanner._flush_doc()
+        self.members = _OrderedDict()
         while not scanner.end():
             member = scanner.read_member()
             self.members[member.name] = member
 
+        self._resolve_types()
+
+    @classmethod
+    def parse(cls, description):
+        """Returns the parsed Interface for the description string.
+
+        The Interface objects are cached and shared by all callers passing the same description,
+        so they must not be modified.
+        """
+        interface = _interface_cache.get(description)
+        if interface is None:
+            interface = cls(description)
+            with _interface_cache_lock:
+                if len(_interface_cache) >= _INTERFACE_CACHE_SIZE:
+                    del _interface_cache[next(iter(_interface_cache))]
+                _interface_cache[description] = interface
+        return interface
+
+    def _resolve_types(self):
+        """Replaces the references to named types in the type trees of all members by the named type itself,
+        so filter_params() does not have to look them up for every value."""
+        seen = set()
+        for member in self.members.values():
+            if isinstance(member, _Method):
+                self._resolve_type_tree(member.in_type, seen)
+                self._resolve_type_tree(member.out_type, seen)
+            else:
+                member.type = self._resolve_type(member.type)
+                self._resolve_type_tree(member.type, seen)
+
+    def _resolve_type(self, varlink_type):
+        names = set()
+        while isinstance(varlink_type, (_CustomType, _Alias)):
+            if isinstance(varlink_type, _CustomType):
+                member = self.members.get(varlink_type.name)
+                if not isinstance(member, _Alias) or varlink_type.name in names:
+                    # unknown type or an alias loop, which filter_params() reports as invalid
+                    return varlink_type
+                names.add(varlink_type.name)
+                varlink_type = member
+            varlink_type = varlink_type.type
+
+        return varlink_type
+
+    def _resolve_type_tree(self, varlink_type, seen):
+        # recursive types make the tree a graph
+        if id(varlink_type) in seen:
+            return
+        seen.add(id(varlink_type))
+
+        if isinstance(varlink_type, _Struct):
+            resolved = False
+            for (name, field_type) in varlink_type.fields.items():
+                if isinstance(field_type, _CustomType):
+                    field_type = self._resolve_type(field_type)
+                    varlink_type.fields[name] = field_type
+                    resolved = True
+                self._resolve_type_tree(field_type, seen)
+            if resolved:
+                varlink_type._update_field_items()
+        elif isinstance(varlink_type, (_Array, _Maybe, _Dict)):
+            varlink_type.element_type = self._resolve_type(varlink_type.element_type)
+            self._resolve_type_tree(varlink_type.element_type, seen)
+
+    def _build_field_filters(self):
+        """Looks up the field filters of all struct types, which filter_params() otherwise does on their first use"""
+        seen = set()
+        types = []
+        for member in self.members.values():
+            if isinstance(member, _Method):
+                types += (member.in_type, member.out_type)
+            else:
+                types.append(member.type)
+
+        while types:
+            varlink_type = types.pop()
+            if id(varlink_type) in seen:
+                continue
+            seen.add(id(varlink_type))
+
+            if isinstance(varlink_type, _Struct):
+                types.extend(field_type for (_, _, field_type, _) in self._struct_field_filters(varlink_type))
+            elif isinstance(varlink_type, (_Array, _Maybe, _Dict)):
+                types.append(varlink_type.element_type)
+
     def get_description(self):
         """return the description string in varlink interface definition language"""
         return self.description
@@ -311,137 +491,187 @@ class Interface(object):
         raise MethodNotFound(name)
 
     def filter_params(self, parent_name, varlink_type, _namespaced, args, kwargs):
+        return self._filter_params((parent_name,), varlink_type, _namespaced, args, kwargs)
+
+    def _filter_params(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        # parent_path is a tuple of the parts of the parameter name, which is only joined for an InvalidParameter
         # print("filter_params", type(varlink_type), repr(varlink_type), args, kwargs, type(args))
 
-        if isinstance(varlink_type, _Maybe):
-            if args == None:
+        t = type(varlink_type)
+        if args is None:
+            # missing optional values are the most common ones, answer them without the filter call
+            if t is _Maybe:
                 return None
-            return self.filter_params(parent_name, varlink_type.element_type, _namespaced, args, kwargs)
-
-        if isinstance(varlink_type, _Dict):
-            if args == None:
+            if t is _Array:
+                return []
+            if t is _Dict:
                 return {}
 
-            if isinstance(args, Mapping):
-                for (k, v) in args.items():
-                    args[k] = self.filter_params(parent_name + '[' + k + ']', varlink_type.element_type, _namespaced, v,
-                                                 None)
-                return args
-            else:
-                InvalidParameter(parent_name)
+        handler = self._filters.get(t)
+        if handler is None:
+            handler = self._find_filter(varlink_type)
 
-        if isinstance(varlink_type, _CustomType):
-            # print("CustomType", varlink_type.name)
-            return self.filter_params(parent_name, self.members.get(varlink_type.name), _namespaced, args, kwargs)
+        return handler(self, parent_path, varlink_type, _namespaced, args, kwargs)
 
-        if isinstance(varlink_type, _Alias):
-            # print("Alias", varlink_type.name)
-            return self.filter_params(parent_name, varlink_type.type, _namespaced, args, kwargs)
+    @classmethod
+    def _find_filter(cls, varlink_type):
+        for (t, handler) in cls._filter_types:
+            if isinstance(varlink_type, t):
+                return handler
 
-        if isinstance(varlink_type, _Object):
-            return args
+        return cls._filter_invalid
+
+    def _filter_invalid(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        raise InvalidParameter("".join(parent_path))
+
+    def _filter_maybe(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        if args == None:
+            return None
+        return self._filter_params(parent_path, varlink_type.element_type, _namespaced, args, kwargs)
+
+    def _filter_dict(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        if args == None:
+            return {}
+
+        if not isinstance(args, Mapping):
+            raise InvalidParameter("".join(parent_path))
 
-        if isinstance(varlink_type, _Enum) and ( isinstance(args, str) or isinstance(args, unicode) ):
-            # print("Returned str:", args)
+        element_type = varlink_type.element_type
+        return {k: self._filter_params(parent_path + ('[', k, ']'), element_type, _namespaced, v, None)
+                for (k, v) in args.items()}
+
+    def _filter_alias(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        # print("Alias", varlink_type.name)
+        return self._filter_params(parent_path, varlink_type.type, _namespaced, args, kwargs)
+
+    def _filter_object(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        return args
+
+    def _filter_enum(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        if isinstance(args, str) and args in varlink_type._values:
             return args
+        raise InvalidParameter("".join(parent_path))
 
-        if isinstance(varlink_type, _Array):
-            if args == None:
-                return []
+    def _filter_array(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        if args == None:
+            return []
 
-            return [self.filter_params(parent_name + '[]', varlink_type.element_type, _namespaced, x, None) for x in
-                    args]
+        convert = _ELEMENT_FILTERS.get(type(varlink_type.element_type))
+        if convert is not None:
+            try:
+                return [convert(x) for x in args]
+            except _InvalidElement:
+                raise InvalidParameter("".join(parent_path + ('[]',)))
+
+        return [self._filter_params(parent_path + ('[]',), varlink_type.element_type, _namespaced, x, None) for x in
+                args]
 
-        if isinstance(varlink_type, Set):
-            # print("Returned set:", set(args))
-            return set(args)
+    def _filter_set(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        # print("Returned set:", set(args))
+        return set(args)
 
-        if isinstance(varlink_type, basestring) and isinstance(args, basestring):
+    def _filter_string(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        if isinstance(args, str):
             return args
+        raise InvalidParameter("".join(parent_path))
 
-        if isinstance(varlink_type, float) and (isinstance(args, float) or isinstance(args, int)):
+    def _filter_float(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        if isinstance(args, float) or isinstance(args, int):
             # print("Returned float:", args)
             return float(args)
+        raise InvalidParameter("".join(parent_path))
 
-        if isinstance(varlink_type, bool) and isinstance(args, bool):
+    def _filter_bool(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        if isinstance(args, bool):
             # print("Returned bool:", args)
             return args
+        # bool is a subclass of int, so numbers have always been accepted like for int
+        return self._filter_int(parent_path, varlink_type, _namespaced, args, kwargs)
 
-        if isinstance(varlink_type, int) and (isinstance(args, float) or isinstance(args, int)):
+    def _filter_int(self, parent_path, varlink_type, _namespaced, args, kwargs):
+        if isinstance(args, float):
             # print("Returned int:", args)
-            if isinstance(args, float):
-                return int(args + 0.5)
+            return int(round(args))
+        if isinstance(args, int):
             return int(args)
-
-        if not isinstance(varlink_type, _Struct):
-            raise InvalidParameter(parent_name)
-            # SyntaxError("Expected type %s, got %s with value '%s'" % (type(varlink_type), type(args),
-            #                                                                args))
-
+        raise InvalidParameter("".join(parent_path))
+
+    def _struct_field_filters(self, varlink_type):
+        # the filter of every field, looked up once per struct type
+        field_filters = varlink_type._field_filters
+        if field_filters is None:
+            field_filters = tuple((name, dot_name, field_type,
+                                   self._filters.get(type(field_type)) or self._find_filter(field_type))
+                                  for (name, dot_name, field_type) in varlink_type._field_items)
+            varlink_type._field_filters = field_filters
+        return field_filters
+
+    def _filter_struct(self, parent_path, varlink_type, _namespaced, args, kwargs):
         if _namespaced:
             out = SimpleNamespace()
         else:
             out = {}
 
-        varlink_struct = None
-        if not isinstance(args, tuple):
-            varlink_struct = args
-            args = None
-
-        for name in varlink_type.fields:
-            if isinstance(args, tuple):
-                if args:
-                    val = args[0]
-                    if len(args) > 1:
-                        args = args[1:]
-                    else:
-                        args = None
-                    ret = self.filter_params(parent_name + "." + name, varlink_type.fields[name], _namespaced, val,
-                                             None)
-                    if ret != None:
-                        # print("SetOUT:", name)
-                        if _namespaced:
-                            setattr(out, name, ret)
-                        else:
-                            out[name] = ret
-                    continue
-                else:
-                    if name in kwargs:
-                        ret = self.filter_params(parent_name + "." + name, varlink_type.fields[name], _namespaced,
-                                                 kwargs[name], None)
-                        if ret != None:
-                            # print("SetOUT:", name)
-                            if _namespaced:
-                                setattr(out, name, ret)
-                            else:
-                                out[name] = ret
-                        continue
+        field_filters = self._struct_field_filters(varlink_type)
 
-            if varlink_struct:
-                if isinstance(varlink_struct, Mapping):
-                    if name not in varlink_struct:
-                        continue
+        if type(args) is SimpleNamespace:
+            # all attributes of a namespace are in its __dict__, no need to probe them with hasattr()
+            args = args.__dict__
 
-                    val = varlink_struct[name]
-                    ret = self.filter_params(parent_name + "." + name, varlink_type.fields[name], _namespaced, val,
-                                             None)
-                    if ret != None:
-                        # print("SetOUT:", name)
-                        if _namespaced:
-                            setattr(out, name, ret)
-                        else:
-                            out[name] = ret
-                elif hasattr(varlink_struct, name):
-                    val = getattr(varlink_struct, name)
-                    ret = self.filter_params(parent_name + "." + name, varlink_type.fields[name], _namespaced, val,
-                                             None)
-                    if ret != None:
-                        # print("SetOUT:", name)
-                        if _namespaced:
-                            setattr(out, name, ret)
-                        else:
-                            out[name] = ret
+        if isinstance(args, tuple):
+            if args:
+                # positional arguments, surplus ones are ignored
+                values = zip(field_filters, args)
+            else:
+                values = ((f, kwargs[f[0]]) for f in field_filters if f[0] in kwargs)
+        elif not args:
+            return out
+        elif isinstance(args, Mapping):
+            values = ((f, args[f[0]]) for f in field_filters if f[0] in args)
+        else:
+            values = ((f, getattr(args, f[0])) for f in field_filters if hasattr(args, f[0]))
+
+        for ((name, dot_name, field_type, handler), val) in values:
+            ret = handler(self, parent_path + (dot_name,), field_type, _namespaced, val, None)
+            if ret != None:
+                if _namespaced:
+                    setattr(out, name, ret)
                 else:
-                    continue
+                    out[name] = ret
 
         return out
+
+    # the filter for each type of the varlink type tree, looked up by the exact type
+    _filters = {
+        _Maybe: _filter_maybe,
+        _Dict: _filter_dict,
+        # _resolve_types() leaves only the names of unknown types, errors, methods and alias loops
+        _CustomType: _filter_invalid,
+        _Alias: _filter_alias,
+        _Object: _filter_object,
+        _Enum: _filter_enum,
+        _Array: _filter_array,
+        type(set()): _filter_set,
+        type(_PRIM_STR): _filter_string,
+        type(_PRIM_FLOAT): _filter_float,
+        type(_PRIM_BOOL): _filter_bool,
+        type(_PRIM_INT): _filter_int,
+        _Struct: _filter_struct,
+    }
+
+    # fallback for subclasses in the order they have to be tested, e.g. bool before int
+    _filter_types = (
+        (_Maybe, _filter_maybe),
+        (_Dict, _filter_dict),
+        (_CustomType, _filter_invalid),
+        (_Alias, _filter_alias),
+        (_Object, _filter_object),
+        (_Enum, _filter_enum),
+        (_Array, _filter_array),
+        (Set, _filter_set),
+        (str, _filter_string),
+        (float, _filter_float),
+        (bool, _filter_bool),
+        (int, _filter_int),
+        (_Struct, _filter_struct),
+    )
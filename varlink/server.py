@@ -1,40 +1,117 @@
 # coding=utf-8
 
-from __future__ import print_function
-from __future__ import unicode_literals
-
+import asyncio
 import inspect
 import json
 import os
+import re
 import socket
 import stat
-import string
 import sys
-
-try:
-    from builtins import int
-    from builtins import object
-    from builtins import open
-    from builtins import range
-except ImportError:
-    pass
+import threading
+from socketserver import (StreamRequestHandler, BaseServer, ThreadingMixIn)
+from types import GeneratorType
 
 from .error import (InterfaceNotFound, InvalidParameter, MethodNotImplemented, VarlinkEncoder, VarlinkError,
                     ConnectionError)
-from .scanner import Interface
+from .scanner import Interface, _Method
+
+if hasattr(os, "fork"):
+    from socketserver import ForkingMixIn
 
 try:
-    from socketserver import (StreamRequestHandler, BaseServer, ThreadingMixIn)
-except ImportError:  # Python2
-    from SocketServer import (StreamRequestHandler, BaseServer, ThreadingMixIn)
+    import orjson
+except ImportError:
+    orjson = None
 
-if hasattr(os, "fork"):
-    try:
-        from socketserver import ForkingMixIn
-    except ImportError:  # Python2
-        from SocketServer import ForkingMixIn
 
-from types import GeneratorType
+def _json_loads_std(message):
+    return json.loads(message.decode('utf-8'))
+
+
+# json.dumps() would create a new encoder for every message
+_encoder = VarlinkEncoder()
+
+
+def _json_dumps_std(o):
+    return _encoder.encode(o).encode('utf-8')
+
+
+if orjson is not None:
+    _default = _encoder.default
+
+    # orjson decodes integers beyond 64 bit to floats, messages which may hold one are left to json
+    _LONG_NUMBER_RE = re.compile(br'\d{19}')
+
+    def _json_loads(message):
+        if _LONG_NUMBER_RE.search(message) is None:
+            try:
+                return orjson.loads(message)
+            except ValueError:
+                pass
+        return _json_loads_std(message)
+
+    def _json_dumps(o):
+        try:
+            return orjson.dumps(o, default=_default)
+        except TypeError:
+            # e.g. integers beyond 64 bit or dictionaries with non string keys
+            return _json_dumps_std(o)
+else:
+    _json_loads = _json_loads_std
+    _json_dumps = _json_dumps_std
+
+
+def _arg_names(func):
+    """Returns the names of the arguments func can be called with as keyword arguments"""
+    return frozenset(k for (k, p) in inspect.signature(func).parameters.items()
+                     if p.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY))
+
+
+# the optional keyword arguments of a handler method as bits of _MethodDispatch.accepts
+_MORE = 1 << 0
+_ONEWAY = 1 << 1
+_UPGRADE = 1 << 2
+_RAW = 1 << 3
+_MESSAGE = 1 << 4
+_INTERFACE = 1 << 5
+_METHOD = 1 << 6
+_SERVER = 1 << 7
+_REQUEST = 1 << 8
+_CALL_FLAGS = _MORE | _ONEWAY | _UPGRADE
+_ARG_BITS = {
+    '_more': _MORE,
+    '_oneway': _ONEWAY,
+    '_upgrade': _UPGRADE,
+    '_raw': _RAW,
+    '_message': _MESSAGE,
+    '_interface': _INTERFACE,
+    '_method': _METHOD,
+    '_server': _SERVER,
+    '_request': _REQUEST,
+}
+
+
+class _MethodDispatch(object):
+    """The handler of a varlink method and the optional keyword arguments it accepts.
+
+    It is collected when the interface is added, so the handler method is only looked up and its signature
+    only inspected once. func is None, if the handler does not implement the method.
+    """
+    __slots__ = ('func', 'interface', 'method', 'field_names', 'field_set', 'accepts')
+
+    def __init__(self, func, interface, method):
+        if not func or not callable(func):
+            func = None
+        arg_names = _arg_names(func) if func else frozenset()
+        self.func = func
+        self.interface = interface
+        self.method = method
+        self.field_names = tuple(method.in_type.fields)
+        self.field_set = frozenset(self.field_names)
+        self.accepts = 0
+        for name in arg_names:
+            self.accepts |= _ARG_BITS.get(name, 0)
 
 
 class Service(object):
@@ -88,6 +165,8 @@ class Service(object):
 
         self.interfaces = {}
         self.interfaces_handlers = {}
+        # the _MethodDispatch of all methods by their full name
+        self._dispatch = {}
         directory = os.path.dirname(__file__)
         self._add_interface(os.path.abspath(os.path.join(directory, 'org.varlink.service.varlink')), self)
 
@@ -112,79 +191,77 @@ class Service(object):
 
     def _handle(self, message, raw_message, _server=None, _request=None):
         try:
-            interface_name, _, method_name = message.get('method', '').rpartition('.')
-            if not interface_name or not method_name:
-                raise InterfaceNotFound(interface_name)
+            dispatch = self._dispatch.get(message.get('method', ''))
+            if dispatch is None or not dispatch.func:
+                interface_name, _, method_name = message.get('method', '').rpartition('.')
+                if not interface_name or not method_name:
+                    raise InterfaceNotFound(interface_name)
+
+                interface = self.interfaces.get(interface_name)
+                if not interface:
+                    raise InterfaceNotFound(interface_name)
 
-            interface = self.interfaces.get(interface_name)
-            if not interface:
-                raise InterfaceNotFound(interface_name)
+                method = interface.get_method(method_name)
 
-            method = interface.get_method(method_name)
+                # the handler may have gained the method since the interface was added
+                handler = self.interfaces_handlers[interface.name]
+                dispatch = _MethodDispatch(getattr(handler, method_name, None), interface, method)
+                if dispatch.func:
+                    self._dispatch[interface.name + '.' + method_name] = dispatch
+
+            interface = dispatch.interface
+            method = dispatch.method
 
             parameters = message.get('parameters', {})
             if parameters == None:
                 parameters = {}
 
-            handler = self.interfaces_handlers[interface.name]
-
-            for name in parameters:
-                if name not in method.in_type.fields:
-                    raise InvalidParameter(name)
+            if not dispatch.field_set.issuperset(parameters):
+                raise InvalidParameter(next(name for name in parameters if name not in dispatch.field_set))
 
-            for name in method.in_type.fields:
-                if name not in parameters:
+            if len(parameters) != len(dispatch.field_names):
+                for name in dispatch.field_set.difference(parameters):
                     parameters[name] = None
 
             parameters = interface.filter_params("server.call", method.in_type, self._namespaced, parameters, None)
 
-            func = getattr(handler, method_name, None)
-
-            if not func or not callable(func):
-                raise MethodNotImplemented(method_name)
+            if not dispatch.func:
+                raise MethodNotImplemented(method.name)
 
             kwargs = {}
 
-            if hasattr(inspect, "signature"):
-                sig = inspect.signature(func)
-                arg_names = [(sig.parameters[k].kind in (
-                    inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY) and k or None) for k in
-                             sig.parameters.keys()]
-            else:
-                from itertools import izip
-                spec = inspect.getargspec(func)
-                matched_args = [reversed(x) for x in [spec.args, spec.defaults or []]]
-                arg_names = dict(izip(*matched_args))
-
-            if message.get('more', False) or message.get('oneway', False) or message.get('upgrade', False):
-                if message.get('more', False) and '_more' in arg_names:
-                    kwargs["_more"] = True
-
-                if message.get('oneway', False) and '_oneway' in arg_names:
-                    kwargs["_oneway"] = True
-
-                if message.get('upgrade', False) and '_upgrade' in arg_names:
-                    kwargs["_upgrade"] = True
-
-            if '_raw' in arg_names:
-                kwargs["_raw"] = raw_message
-            if '_message' in arg_names:
-                kwargs["_message"] = message
-            if '_interface' in arg_names:
-                kwargs["_interface"] = interface
-            if '_method' in arg_names:
-                kwargs["_method"] = method
-            if '_server' in arg_names:
-                kwargs["_server"] = _server
-            if '_request' in arg_names:
-                kwargs["_request"] = _request
-
+            # most handlers accept none of the optional keyword arguments
+            accepts = dispatch.accepts
+            if accepts:
+                if accepts & _CALL_FLAGS:
+                    if accepts & _MORE and message.get('more', False):
+                        kwargs["_more"] = True
+
+                    if accepts & _ONEWAY and message.get('oneway', False):
+                        kwargs["_oneway"] = True
+
+                    if accepts & _UPGRADE and message.get('upgrade', False):
+                        kwargs["_upgrade"] = True
+
+                if accepts & _RAW:
+                    kwargs["_raw"] = raw_message
+                if accepts & _MESSAGE:
+                    kwargs["_message"] = message
+                if accepts & _INTERFACE:
+                    kwargs["_interface"] = interface
+                if accepts & _METHOD:
+                    kwargs["_method"] = method
+                if accepts & _SERVER:
+                    kwargs["_server"] = _server
+                if accepts & _REQUEST:
+                    kwargs["_request"] = _request
+
+            # the filtered parameters leave out the fields which are None
             if self._namespaced:
-                # FIXME: check for Maybe before taking None as default value
-                out = func(*(getattr(parameters, k, default=None) for k in method.in_type.fields.keys()), **kwargs)
-            else:
-                # FIXME: check for Maybe before taking None as default value
-                out = func(*(parameters.get(k) for k in method.in_type.fields.keys()), **kwargs)
+                parameters = parameters.__dict__
+
+            # FIXME: check for Maybe before taking None as default value
+            out = dispatch.func(*map(parameters.get, dispatch.field_names), **kwargs)
 
             if isinstance(out, GeneratorType):
                 try:
@@ -197,8 +274,8 @@ class Service(object):
 
                         cont = True
                         if '_continues' in o:
+                            # filter_params() leaves it out, the reply of the handler is not modified
                             cont = o['_continues']
-                            del o['_continues']
                             yield {'continues': bool(cont),
                                    'parameters': interface.filter_params("server.reply", method.out_type,
                                                                          self._namespaced, o,
@@ -233,33 +310,57 @@ class Service(object):
             >>>    connection.write(outgoing_message)
         """
         if not message:
-            return
+            return iter(())
 
         if message[-1] == 0:
             message = message[:-1]
 
-        string = message.decode('utf-8')
-        handle = self._handle(json.loads(string), message, _server, _request)
+        return self._handle_message(message, _server, _request)
+
+    def _handle_message(self, message, _server=None, _request=None):
+        """Like handle(), for a message without the terminating null byte, which is not empty"""
+        handle = self._handle(_json_loads(message), message, _server, _request)
         for out in handle:
             if out == None:
                 return
             try:
-                yield json.dumps(out, cls=VarlinkEncoder).encode('utf-8')
+                yield _json_dumps(out)
             except ConnectionError as e:
                 try:
                     handle.throw(e)
                 except StopIteration:
                     pass
 
+    def warmup(self):
+        """Builds the lookup tables of all interfaces, which are otherwise built on the first call of a method.
+
+        The :class:`Server` calls it, when it is created. Call it again before :meth:`Server.serve_forever`
+        of a :class:`ForkingServer`, if interfaces were added after, so the forked processes share the tables
+        instead of each building its own.
+        """
+        for interface in self.interfaces.values():
+            interface._build_field_filters()
+
     def _add_interface(self, filename, handler):
         if not os.path.isabs(filename):
             filename = os.path.join(self.interface_dir, filename + '.varlink')
 
         with open(filename) as f:
-            interface = Interface(f.read())
+            # services in one process share the parsed interface, e.g. org.varlink.service
+            interface = Interface.parse(f.read())
             self.interfaces[interface.name] = interface
             self.interfaces_handlers[interface.name] = handler
 
+            prefix = interface.name + '.'
+            # not by the prefix, which also matches e.g. org.example.more for org.example
+            for name in [name for (name, dispatch) in self._dispatch.items()
+                         if dispatch.interface.name == interface.name]:
+                del self._dispatch[name]
+            for member in interface.members.values():
+                if isinstance(member, _Method):
+                    self._dispatch[prefix + member.name] = _MethodDispatch(getattr(handler, member.name, None),
+                                                                           interface, member)
+
     def _set_interface(self, filename, interface_class):
         if 'class' in str(type(interface_class)):
             ic = interface_class
@@ -305,13 +406,13 @@ def get_listen_fd():
         except OSError:
             return None
 
-    fields = string.split(os.environ["LISTEN_FDNAMES"], ":")
+    fields = os.environ.get("LISTEN_FDNAMES", "").split(":")
 
     if len(fields) != fds:
         return None
 
-    for i in range(len(fields)):
-        if fields[i] == "varlink":
+    for (i, name) in enumerate(fields):
+        if name == "varlink":
             try:
                 if stat.S_ISSOCK(os.fstat(i + 3).st_mode):
                     return i + 3
@@ -329,28 +430,48 @@ class RequestHandler(StreamRequestHandler):
     """
     service = None
 
+    def _send_reply(self, reply):
+        # every reply is sent right away, replies of a 'more' call have to reach the client while it runs
+        if hasattr(self.request, "sendmsg"):
+            # the reply and its terminating null byte in one syscall, without copying the reply
+            sent = self.request.sendmsg([reply, b'\0'])
+            if sent <= len(reply):
+                self.request.sendall(memoryview(reply)[sent:])
+                self.request.sendall(b'\0')
+        else:
+            self.wfile.write(reply + b'\0')
+
     def handle(self):
-        message = b''
+        # the received data, which can hold several messages or the start of one
+        buf = bytearray()
 
         self.request.setblocking(True)
-        while not self.rfile.closed:
+        while True:
             try:
-                c = self.rfile.read(1)
+                data = self.request.recv(65536)
             except BrokenPipeError:
                 break
 
-            if c == b'':
+            if not data:
                 break
 
-            if c != b'\0':
-                message += c
-                continue
+            # the data received before holds no complete message
+            scanned = len(buf)
+            buf += data
 
-            for reply in self.service.handle(message, _server=self.server, _request=self.request):
-                if reply != None:
-                    self.wfile.write(reply + b'\0')
+            start = 0
+            end = buf.find(b'\0', scanned)
+            while end != -1:
+                if end > start:
+                    message = bytes(buf[start:end])
+                    for reply in self.service._handle_message(message, _server=self.server, _request=self.request):
+                        if reply != None:
+                            self._send_reply(reply)
 
-            message = b''
+                start = end + 1
+                end = buf.find(b'\0', start)
+
+            del buf[:start]
 
 
 class Server(BaseServer):
@@ -384,6 +505,10 @@ class Server(BaseServer):
 
     allow_reuse_address = True
 
+    # several servers, e.g. one per process, can listen on the same TCP port and the kernel distributes
+    # the connections between them
+    allow_reuse_port = False
+
     def __init__(self, server_address, RequestHandlerClass, bind_and_activate=True):
         self.remove_file = None
         self.mode = None
@@ -410,7 +535,6 @@ class Server(BaseServer):
 
             server_address = address
             self.socket = socket.socket(self.address_family, self.socket_type)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
         elif server_address.startswith("tcp:"):
             address = server_address[4:]
@@ -440,6 +564,10 @@ class Server(BaseServer):
 
         BaseServer.__init__(self, server_address, RequestHandlerClass)
 
+        service = getattr(RequestHandlerClass, "service", None)
+        if service is not None:
+            service.warmup()
+
         if bind_and_activate:
             try:
                 self.server_bind()
@@ -454,11 +582,14 @@ class Server(BaseServer):
         May be overridden.
 
         """
-        if self.allow_reuse_address:
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket.setblocking(True)
-
-        if not self.listen_fd:
+        if self.listen_fd:
+            # the activated socket is already bound, but may have been passed non-blocking
+            self.socket.setblocking(True)
+        else:
+            if self.allow_reuse_address:
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.allow_reuse_port and self.address_family in (socket.AF_INET, socket.AF_INET6):
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             self.socket.bind(self.server_address)
 
         self.server_address = self.socket.getsockname()
@@ -505,7 +636,11 @@ class Server(BaseServer):
         May be overridden.
 
         """
-        return self.socket.accept()
+        request = self.socket.accept()
+        if self.address_family in (socket.AF_INET, socket.AF_INET6):
+            # the replies of a call with 'more' are small messages, which must not wait for the ACK of the previous one
+            request[0].setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return request
 
     def shutdown_request(self, request):
         """Called to shutdown and close an individual request."""
@@ -534,3 +669,121 @@ class ThreadingServer(ThreadingMixIn, Server): pass
 
 if hasattr(os, "fork"):
     class ForkingServer(ForkingMixIn, Server): pass
+
+
+class AsyncServer(Server):
+    """Server, which handles all connections in one asyncio event loop instead of a thread per connection
+
+    Initialized like :class:`Server`, with a subclass of :class:`RequestHandler`, which holds the service.
+    An idle connection only costs a registration in the event loop, so many long-lived connections can be served.
+
+    The handler methods are called in the event loop, a method blocking for a while blocks all connections.
+    The _request argument of a handler method is the socket of the connection, which the handler must not
+    read from or write to, so connection upgrades are not supported.
+
+        >>> server = varlink.AsyncServer(sys.argv[1][10:], ServiceRequestHandler)
+        >>> server.serve_forever()
+
+    Within a running event loop, use the coroutine :meth:`serve` instead of :meth:`serve_forever`.
+    """
+
+    def __init__(self, server_address, RequestHandlerClass, bind_and_activate=True):
+        self._loop = None
+        self._stop = None
+        # guards _loop, _stop and _shutdown_request between serve() and shutdown() from another thread
+        self._lock = threading.Lock()
+        self._shutdown_request = False
+        # the writers of the open connections, which are closed on shutdown
+        self._writers = set()
+        self._is_shut_down = threading.Event()
+        self._is_shut_down.set()
+        Server.__init__(self, server_address, RequestHandlerClass, bind_and_activate)
+
+    async def serve(self):
+        """Handles the connections until :meth:`shutdown` is called"""
+        with self._lock:
+            self._loop = asyncio.get_event_loop()
+            self._stop = asyncio.Event()
+            if self._shutdown_request:
+                # shutdown() was called before serve() started
+                self._stop.set()
+            self._is_shut_down.clear()
+        try:
+            self.socket.setblocking(False)
+            if self.address_family == getattr(socket, "AF_UNIX", None):
+                server = await asyncio.start_unix_server(self._handle_connection, sock=self.socket)
+            else:
+                server = await asyncio.start_server(self._handle_connection, sock=self.socket)
+
+            try:
+                await self._stop.wait()
+            finally:
+                server.close()
+                # since Python 3.12, wait_closed() waits for the connections to be closed
+                for writer in list(self._writers):
+                    writer.close()
+                await server.wait_closed()
+        finally:
+            with self._lock:
+                self._loop = None
+                self._stop = None
+                self._shutdown_request = False
+                self._is_shut_down.set()
+
+    def serve_forever(self, poll_interval=None):
+        """Runs :meth:`serve` in a new event loop until :meth:`shutdown` is called"""
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.serve())
+        finally:
+            loop.close()
+
+    def shutdown(self):
+        """Stops :meth:`serve` and waits for it to finish, to be called from another thread
+
+        If :meth:`serve` has not started yet, it returns right away and the next :meth:`serve` stops at once.
+        """
+        with self._lock:
+            self._shutdown_request = True
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._stop.set)
+        self._is_shut_down.wait()
+
+    async def _handle_connection(self, reader, writer):
+        service = self.RequestHandlerClass.service
+        request = writer.get_extra_info("socket")
+        # asyncio sets TCP_NODELAY for TCP connections itself since Python 3.7
+        # the received data, which can hold several messages or the start of one
+        buf = bytearray()
+        self._writers.add(writer)
+
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+
+                # the data received before holds no complete message
+                scanned = len(buf)
+                buf += data
+
+                start = 0
+                end = buf.find(b'\0', scanned)
+                while end != -1:
+                    if end > start:
+                        message = bytes(buf[start:end])
+                        for reply in service._handle_message(message, _server=self, _request=request):
+                            if reply != None:
+                                writer.write(reply)
+                                writer.write(b'\0')
+                        await writer.drain()
+
+                    start = end + 1
+                    end = buf.find(b'\0', start)
+
+                del buf[:start]
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
@@ -1,17 +1,12 @@
-from __future__ import print_function
-from __future__ import unicode_literals
-
+import json
 import os
+import shutil
 import socket
+import tempfile
 import threading
 import unittest
 from sys import platform
 
-try:
-    from builting import str
-except ImportError:
-    pass
-
 import varlink
 
 service = varlink.Service(
@@ -27,9 +22,16 @@ class ServiceRequestHandler(varlink.RequestHandler):
     service = service
 
 
+# makes the unix socket addresses unique per test process
+_ADDRESS_SUFFIX = str(os.getpid()) + threading.current_thread().name
+
+
 class TestService(unittest.TestCase):
-    def do_run(self, address):
-        server = varlink.ThreadingServer(address, ServiceRequestHandler)
+    def do_run(self, address, server_class=varlink.ThreadingServer):
+        server = server_class(address, ServiceRequestHandler)
+        if address.startswith("tcp:"):
+            # the port the server got for port 0
+            address = "tcp:%s:%d" % server.server_address[:2]
         server_thread = threading.Thread(target=server.serve_forever)
         server_thread.daemon = True
         server_thread.start()
@@ -53,22 +55,240 @@ class TestService(unittest.TestCase):
             server.server_close()
 
     def test_tcp(self):
-        self.do_run("tcp:127.0.0.1:23450")
+        self.do_run("tcp:127.0.0.1:0")
 
     def test_anon_unix(self):
         if platform.startswith("linux"):
-            self.do_run("unix:@org.varlink.service_anon_test"
-                        + str(os.getpid())
-                        + threading.current_thread().name
-                        )
+            self.do_run("unix:@org.varlink.service_anon_test" + _ADDRESS_SUFFIX)
 
     def test_unix(self):
         if hasattr(socket, "AF_UNIX"):
-            self.do_run("unix:org.varlink.service_anon_test_"
-                        + str(os.getpid())
-                        + threading.current_thread().name
-                        )
+            self.do_run("unix:org.varlink.service_anon_test_" + _ADDRESS_SUFFIX)
+
+    def test_async_tcp(self):
+        self.do_run("tcp:127.0.0.1:0", varlink.AsyncServer)
+
+    def test_async_unix(self):
+        if hasattr(socket, "AF_UNIX"):
+            self.do_run("unix:org.varlink.service_async_test_" + _ADDRESS_SUFFIX, varlink.AsyncServer)
+
+    def test_async_shutdown(self):
+        # shutdown() right after the start must not miss the serving loop,
+        # shutdown() before the start stops serve_forever() at once
+        for shutdown_first in (False, True):
+            server = varlink.AsyncServer("tcp:127.0.0.1:0", ServiceRequestHandler)
+            try:
+                if shutdown_first:
+                    server.shutdown()
+                server_thread = threading.Thread(target=server.serve_forever)
+                server_thread.daemon = True
+                server_thread.start()
+                if not shutdown_first:
+                    server.shutdown()
+                server_thread.join(10)
+                self.assertFalse(server_thread.is_alive())
+            finally:
+                server.server_close()
+
+    def test_async_shutdown_connected(self):
+        server = varlink.AsyncServer("tcp:127.0.0.1:0", ServiceRequestHandler)
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+        try:
+            with varlink.Client("tcp:%s:%d" % server.server_address[:2]) as client, \
+                    client.open('org.varlink.service') as _connection:
+                self.assertEqual(_connection.GetInfo(), service.GetInfo())
+
+                # shutdown() with the connection still open
+                shutdown_thread = threading.Thread(target=server.shutdown)
+                shutdown_thread.daemon = True
+                shutdown_thread.start()
+                shutdown_thread.join(10)
+                self.assertFalse(shutdown_thread.is_alive())
+                server_thread.join(10)
+                self.assertFalse(server_thread.is_alive())
+        finally:
+            server.server_close()
+
+    def test_reuse_port(self):
+        if not hasattr(socket, "SO_REUSEPORT"):
+            return
+
+        class ReusePortServer(varlink.ThreadingServer):
+            allow_reuse_port = True
+
+        server = ReusePortServer("tcp:127.0.0.1:0", ServiceRequestHandler)
+        try:
+            address = "tcp:%s:%d" % server.server_address[:2]
+            with ReusePortServer(address, ServiceRequestHandler) as server2:
+                self.assertEqual(server2.server_address, server.server_address)
+        finally:
+            server.server_close()
+
+    def test_connection_pool(self):
+        if not hasattr(socket, "AF_UNIX"):
+            return
+
+        address = "unix:org.varlink.service_pool_test_" + _ADDRESS_SUFFIX
+        server = varlink.ThreadingServer(address, ServiceRequestHandler)
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+        try:
+            with varlink.Client(address, pool_size=1) as client:
+                with client.open('org.varlink.service') as _connection:
+                    connection = _connection._connection
+                    self.assertEqual(_connection.GetInfo(), service.GetInfo())
+
+                with client.open('org.varlink.service') as _connection:
+                    self.assertIs(_connection._connection, connection)
+                    self.assertEqual(_connection.GetInfo(), service.GetInfo())
+
+                    with client.open('org.varlink.service') as _connection2:
+                        self.assertIsNot(_connection2._connection, connection)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_interrupted_call_not_released(self):
+        class TimingOut(object):
+            """A connection, whose send times out after writing the start of the message"""
+
+            def __init__(self, connection):
+                self.connection = connection
+
+            def sendall(self, data):
+                self.connection.sendall(data[:10])
+                raise socket.timeout
+
+            def recv(self, n):
+                return self.connection.recv(n)
+
+            def close(self):
+                self.connection.close()
+
+        (a, b) = socket.socketpair()
+        released = []
+        try:
+            with varlink.SimpleClientInterfaceHandler(service.interfaces['org.varlink.service'], TimingOut(a),
+                                                      release=released.append) as _connection:
+                self.assertRaises(socket.timeout, _connection.GetInfo)
+            self.assertEqual(released, [])
+        finally:
+            a.close()
+            b.close()
+
+    def test_connection_is_idle_keeps_timeout(self):
+        if not hasattr(socket, "socketpair"):
+            return
+
+        (a, b) = socket.socketpair()
+        try:
+            a.settimeout(2.5)
+            self.assertTrue(varlink.client._connection_is_idle(a))
+            self.assertEqual(a.gettimeout(), 2.5)
+
+            b.sendall(b'x')
+            self.assertFalse(varlink.client._connection_is_idle(a))
+            self.assertEqual(a.gettimeout(), 2.5)
+        finally:
+            a.close()
+            b.close()
 
     def test_wrong_url(self):
         self.assertRaises(varlink.ConnectionError, self.do_run,
                           "uenix:org.varlink.service_wrong_url_test_%d" % os.getpid())
+
+    def test_invalid_parameter(self):
+        reply = b''.join(service.handle(b'{"method": "org.varlink.service.GetInterfaceDescription",'
+                                        b' "parameters": {"interface": "org.varlink.service", "foo": 1}}'))
+        self.assertIn(b'"org.varlink.service.InvalidParameter"', reply)
+        self.assertIn(b'"foo"', reply)
+
+        reply = b''.join(service.handle(b'{"method": "org.varlink.service.GetInterfaceDescription"}'))
+        self.assertIn(b'"org.varlink.service.InvalidParameter"', reply)
+        self.assertIn(b'"server.call.interface"', reply)
+
+    def test_handle_framing(self):
+        self.assertEqual(list(service.handle(b'')), [])
+        self.assertEqual(b''.join(service.handle(b'{"method": "org.varlink.service.GetInfo"}\0')),
+                         b''.join(service.handle(b'{"method": "org.varlink.service.GetInfo"}')))
+
+    def test_listen_fd_names(self):
+        env = {"LISTEN_PID": str(os.getpid()), "LISTEN_FDS": "2", "LISTEN_FDNAMES": "foo:bar"}
+        saved = {k: os.environ.get(k) for k in env}
+        os.environ.update(env)
+        try:
+            self.assertIsNone(varlink.get_listen_fd())
+            os.environ["LISTEN_FDNAMES"] = "varlink"
+            self.assertIsNone(varlink.get_listen_fd())
+
+            # the varlink socket is the second passed file descriptor, 4
+            os.environ["LISTEN_FDNAMES"] = "foo:varlink"
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                saved_fd = os.dup(4)
+            except OSError:
+                saved_fd = None
+            try:
+                os.dup2(listener.fileno(), 4)
+                self.assertEqual(varlink.get_listen_fd(), 4)
+            finally:
+                if saved_fd is None:
+                    os.close(4)
+                else:
+                    os.dup2(saved_fd, 4)
+                    os.close(saved_fd)
+                listener.close()
+        finally:
+            for (k, v) in saved.items():
+                if v is None:
+                    del os.environ[k]
+                else:
+                    os.environ[k] = v
+
+    def test_namespaced(self):
+        namespaced_service = varlink.Service(
+            vendor='Varlink',
+            product='Varlink Examples',
+            version='1',
+            url='http://varlink.org',
+            namespaced=True
+        )
+        reply = b''.join(namespaced_service.handle(b'{"method": "org.varlink.service.GetInterfaceDescription",'
+                                                   b' "parameters": {"interface": "org.varlink.service"}}'))
+        self.assertIn(b'"description"', reply)
+        self.assertIn(b'interface org.varlink.service', reply)
+
+    def test_readd_interface(self):
+        interface_dir = tempfile.mkdtemp()
+        try:
+            shutil.copy(os.path.join(os.path.dirname(__file__), "org.example.more.varlink"), interface_dir)
+            with open(os.path.join(interface_dir, "org.example.varlink"), "w") as f:
+                f.write("interface org.example\nmethod Ping(ping: string) -> (pong: string)\n")
+
+            prefix_service = varlink.Service(interface_dir=interface_dir)
+
+            class Example(object):
+                def Ping(self, ping):
+                    return {"pong": ping}
+
+            prefix_service.interface('org.example.more')(Example)
+            prefix_service.interface('org.example')(Example)
+            more_dispatch = prefix_service._dispatch['org.example.more.Ping']
+
+            # adding org.example again keeps the records of org.example.more
+            prefix_service.interface('org.example')(Example)
+            self.assertIs(prefix_service._dispatch['org.example.more.Ping'], more_dispatch)
+            self.assertIsNot(prefix_service._dispatch['org.example.Ping'].interface, more_dispatch.interface)
+        finally:
+            shutil.rmtree(interface_dir)
+
+    def test_long_integers(self):
+        for n in (2 ** 64 - 1, 2 ** 64, -2 ** 63 - 1, 10 ** 30):
+            message = ('{"a": [%d, 1.5, "%d"]}' % (n, n)).encode('utf-8')
+            self.assertEqual(varlink.server._json_loads(message), {"a": [n, 1.5, str(n)]})
+            self.assertEqual(json.loads(varlink.server._json_dumps({"a": n}).decode('utf-8')), {"a": n})
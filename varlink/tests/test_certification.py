@@ -1,11 +1,6 @@
 #!/usr/bin/env python
 
-from __future__ import print_function
-from __future__ import unicode_literals
-
-import codecs
 import getopt
-import json
 import math
 import os
 import shlex
@@ -16,13 +11,6 @@ import time
 import unittest
 from sys import platform
 
-try:
-    from builtins import object
-    from builtins import range
-    from builtins import str
-except ImportError:
-    pass
-
 import varlink
 
 
@@ -78,8 +66,19 @@ class ServiceRequestHandler(varlink.RequestHandler):
     service = service
 
 
+class CertificationServer(varlink.ThreadingServer):
+    """The server with the state of the certification clients, which CertService keeps as _server"""
+
+    def __init__(self, server_address, RequestHandlerClass=ServiceRequestHandler, bind_and_activate=True):
+        # the (method to call next, creation time) of the clients by client id
+        self.clients = {}
+        # the time the expired clients were last removed
+        self.last_sweep = 0
+        varlink.ThreadingServer.__init__(self, server_address, RequestHandlerClass, bind_and_activate)
+
+
 def sorted_json(dct):
-    if isinstance(dct, type([])):
+    if isinstance(dct, list):
         return sorted(dct)
     return dct
 
@@ -92,68 +91,86 @@ class CertificationError(varlink.VarlinkError):
                                        'parameters': {'wants': wants, 'got': got}})
 
 
+# the values passed in the certification, built once instead of for every call
+_STRUCT = {"bool": False, "int": 2, "float": math.pi, "string": "a lot of string"}
+
+_MAP = {"foo": "Foo", "bar": "Bar"}
+
+_MYTYPE = {
+    "object": {"method": "org.varlink.certification.Test09",
+               "parameters": {"map": _MAP}},
+    "enum": "two",
+    "struct": {"first": 1, "second": "2"},
+    "array": ["one", "two", "three"],
+    "dictionary": _MAP,
+    "stringset": {"one", "two", "three"},
+    "interface": {
+        "foo": [
+            None,
+            {"foo": "foo", "bar": "bar"},
+            None,
+            {"one": "foo", "two": "bar"}
+        ],
+        "anon": {"foo": True, "bar": False}
+    }
+}
+
+_WANTS_START = {"method": "org.varlink.certification.Start"}
+
+_MORE_REPLIES = ["Reply number %d" % i for i in range(1, 11)]
+
+_TEST10_REPLIES = [{"string": string, "_continues": i != len(_MORE_REPLIES)}
+                   for (i, string) in enumerate(_MORE_REPLIES, 1)]
+
+
 @service.interface('org.varlink.certification')
 class CertService(object):
-    next_method = {}
-
     def new_client_id(self, _server):
-        client_id = codecs.getencoder('hex')(os.urandom(16))[0].decode("ascii")
-        if not hasattr(_server, "next_method"):
-            _server.next_method = {}
-        if not hasattr(_server, "lifetimes"):
-            _server.lifetimes = []
-
-        _server.next_method[client_id] = "Start"
-        _server.lifetimes.append((time.time(), client_id))
+        client_id = os.urandom(16).hex()
+        _server.clients[client_id] = ("Start", time.time())
         return client_id
 
     def check_lifetimes(self, _server):
-        if not hasattr(_server, "lifetimes"):
-            return
-
         now = time.time()
-        while True:
-            if len(_server.lifetimes) == 0:
-                return
-
-            (t, client_id) = _server.lifetimes[0]
-            if (now - t) < (60 * 60 * 12):
-                return
+        # clients expire after 12 hours, looking for them once a minute is enough
+        if now - _server.last_sweep < 60:
+            return
+        _server.last_sweep = now
 
-            del _server.lifetimes[0]
-            if hasattr(_server, "next_method") and client_id in _server.next_method:
-                del _server.next_method[client_id]
+        expired = [client_id for (client_id, (_, t)) in list(_server.clients.items()) if (now - t) >= (60 * 60 * 12)]
+        for client_id in expired:
+            _server.clients.pop(client_id, None)
 
     def assert_raw(self, client_id, _server, _raw, _message, wants):
         if wants != _message:
-            del _server.next_method[client_id]
-            raise CertificationError(wants, json.loads(_raw.decode('utf-8')))
+            del _server.clients[client_id]
+            raise CertificationError(wants, varlink.server._json_loads(_raw))
 
     def assert_cmp(self, client_id, _server, _raw, wants, _bool):
         if not _bool:
-            del _server.next_method[client_id]
-            raise CertificationError(wants, json.loads(_raw.decode('utf-8')))
+            del _server.clients[client_id]
+            raise CertificationError(wants, varlink.server._json_loads(_raw))
 
     def assert_method(self, client_id, _server, from_method, next_method):
-        if not hasattr(_server, "next_method") or client_id not in _server.next_method:
+        self.check_lifetimes(_server)
+
+        client = _server.clients.get(client_id)
+        if client is None:
             raise CertificationError({"method": "org.varlink.certification.Start+++"},
                                      {"method": "org.varlink.certification." + from_method})
 
-        self.check_lifetimes(_server)
-
-        if from_method != _server.next_method[client_id]:
-            raise CertificationError("Call to method org.varlink.certification." + _server.next_method[client_id],
+        (expected_method, created) = client
+        if from_method != expected_method:
+            raise CertificationError("Call to method org.varlink.certification." + expected_method,
                                      "Call to method org.varlink.certification." + from_method)
-        _server.next_method[client_id] = next_method
+        _server.clients[client_id] = (next_method, created)
 
     def Start(self, _server=None, _raw=None, _message=None, _oneway=False):
         client_id = self.new_client_id(_server)
         if 'parameters' in _message and not _message['parameters']:
             del _message['parameters']
         self.assert_method(client_id, _server, "Start", "Test01")
-        self.assert_raw(client_id, _server, _raw, _message, {
-            "method": "org.varlink.certification.Start",
-        })
+        self.assert_raw(client_id, _server, _raw, _message, _WANTS_START)
         return {"client_id": client_id}
 
     # () -> (bool: bool)
@@ -172,7 +189,7 @@ class CertService(object):
             "method": "org.varlink.certification.Test02",
             "parameters": {"client_id": client_id, "bool": True}
         }
-        self.assert_cmp(client_id, _server, _raw, wants, _bool == True)
+        self.assert_cmp(client_id, _server, _raw, wants, _bool is True)
         self.assert_raw(client_id, _server, _raw, _message, wants)
         return {"int": 1}
 
@@ -207,7 +224,7 @@ class CertService(object):
         }
         self.assert_cmp(client_id, _server, _raw, wants, _string == "ping")
         self.assert_raw(client_id, _server, _raw, _message, wants)
-        return {"bool": False, "int": 2, "float": math.pi, "string": "a lot of string"}
+        return _STRUCT
 
     # (bool: bool, int: int, float: float, string: string)
     # -> (struct: (bool: bool, int: int, float: float, string: string))
@@ -215,38 +232,29 @@ class CertService(object):
         self.assert_method(client_id, _server, "Test06", "Test07")
         wants = {
             "method": "org.varlink.certification.Test06",
-            "parameters": {
-                "client_id": client_id,
-                "bool": False,
-                "int": 2,
-                "float": math.pi,
-                "string": "a lot of string"
-            }
+            "parameters": dict(_STRUCT, client_id=client_id)
         }
         self.assert_raw(client_id, _server, _raw, _message, wants)
         self.assert_cmp(client_id, _server, _raw, wants, _int == 2)
-        self.assert_cmp(client_id, _server, _raw, wants, _bool == False)
+        self.assert_cmp(client_id, _server, _raw, wants, _bool is False)
         self.assert_cmp(client_id, _server, _raw, wants, _float == math.pi)
         self.assert_cmp(client_id, _server, _raw, wants, _string == "a lot of string")
 
-        return {"struct": {"bool": False, "int": 2, "float": math.pi, "string": "a lot of string"}}
+        return {"struct": _STRUCT}
 
     # (struct: (bool: bool, int: int, float: float, string: string)) -> (map: [string]string)
     def Test07(self, client_id, _dict, _server=None, _raw=None, _message=None):
         self.assert_method(client_id, _server, "Test07", "Test08")
         wants = {
             "method": "org.varlink.certification.Test07",
-            "parameters": {
-                "client_id": client_id,
-                "struct": {"bool": False, "int": 2, "float": math.pi, "string": "a lot of string"}
-            }
+            "parameters": {"client_id": client_id, "struct": _STRUCT}
         }
         self.assert_raw(client_id, _server, _raw, _message, wants)
         self.assert_cmp(client_id, _server, _raw, wants, _dict["int"] == 2)
-        self.assert_cmp(client_id, _server, _raw, wants, _dict["bool"] == False)
+        self.assert_cmp(client_id, _server, _raw, wants, _dict["bool"] is False)
         self.assert_cmp(client_id, _server, _raw, wants, _dict["float"] == math.pi)
         self.assert_cmp(client_id, _server, _raw, wants, _dict["string"] == "a lot of string")
-        return {"map": {"foo": "Foo", "bar": "Bar"}}
+        return {"map": _MAP}
 
     # (map: [string]string) -> (set: [string]())
     def Test08(self, client_id, _map, _server=None, _raw=None, _message=None):
@@ -254,7 +262,7 @@ class CertService(object):
         self.assert_raw(client_id, _server, _raw, _message,
                         {
                             "method": "org.varlink.certification.Test08",
-                            "parameters": {"client_id": client_id, "map": {"foo": "Foo", "bar": "Bar"}}
+                            "parameters": {"client_id": client_id, "map": _MAP}
                         })
         return {"set": {"one", "two", "three"}}
 
@@ -276,26 +284,7 @@ class CertService(object):
         self.assert_cmp(client_id, _server, _raw, wants, "three" in _set)
         return {
             "client_id": client_id,
-            "mytype": {
-                "object": {"method": "org.varlink.certification.Test09",
-                           "parameters": {"map": {"foo": "Foo", "bar": "Bar"}}},
-                "enum": "two",
-                "struct": {"first": 1, "second": "2"},
-                "array": ["one", "two", "three"],
-                "dictionary": {"foo": "Foo", "bar": "Bar"},
-                "stringset": {"one", "two", "three"},
-                "nullable": None,
-                "nullable_array_struct": None,
-                "interface": {
-                    "foo": [
-                        None,
-                        {"foo": "foo", "bar": "bar"},
-                        None,
-                        {"one": "foo", "two": "bar"}
-                    ],
-                    "anon": {"foo": True, "bar": False}
-                }
-            }
+            "mytype": dict(_MYTYPE, nullable=None, nullable_array_struct=None)
         }
 
     # method Test10(mytype: MyType) -> (string: string)
@@ -305,27 +294,7 @@ class CertService(object):
         wants = {
             "method": "org.varlink.certification.Test10",
             "more": True,
-            "parameters": {
-                "client_id": client_id,
-                "mytype": {
-                    "object": {"method": "org.varlink.certification.Test09",
-                               "parameters": {"map": {"foo": "Foo", "bar": "Bar"}}},
-                    "enum": "two",
-                    "struct": {"first": 1, "second": "2"},
-                    "array": ["one", "two", "three"],
-                    "dictionary": {"foo": "Foo", "bar": "Bar"},
-                    "stringset": {"one", "two", "three"},
-                    "interface": {
-                        "foo": [
-                            None,
-                            {"foo": "foo", "bar": "bar"},
-                            None,
-                            {"one": "foo", "two": "bar"}
-                        ],
-                        "anon": {"foo": True, "bar": False}
-                    }
-                }
-            }
+            "parameters": {"client_id": client_id, "mytype": _MYTYPE}
         }
 
         if "nullable" in mytype:
@@ -338,8 +307,7 @@ class CertService(object):
 
         self.assert_cmp(client_id, _server, _raw, wants, mytype == wants["parameters"]["mytype"])
 
-        for i in range(1, 11):
-            yield {"string": "Reply number %d" % i, '_continues': i != 10}
+        yield from _TEST10_REPLIES
 
     # method Test11(last_more_replies: []string) -> ()
     def Test11(self, client_id, last_more_replies, _server=None, _raw=None, _message=None, _oneway=False):
@@ -347,20 +315,12 @@ class CertService(object):
         wants = {
             "oneway": True,
             "method": "org.varlink.certification.Test11",
-            "parameters": {
-                "client_id": client_id,
-                "last_more_replies": [
-                    "Reply number 1", "Reply number 2", "Reply number 3", "Reply number 4",
-                    "Reply number 5", "Reply number 6", "Reply number 7", "Reply number 8",
-                    "Reply number 9", "Reply number 10"
-                ]
-            }
+            "parameters": {"client_id": client_id, "last_more_replies": _MORE_REPLIES}
         }
 
         self.assert_cmp(client_id, _server, _raw, wants, _oneway)
 
-        for i in range(0, 10):
-            self.assert_cmp(client_id, _server, _raw, wants, last_more_replies[i] == "Reply number %d" % (i + 1))
+        self.assert_cmp(client_id, _server, _raw, wants, last_more_replies == _MORE_REPLIES)
 
     # method End() -> ()
     def End(self, client_id, _server=None, _raw=None, _message=None):
@@ -371,12 +331,12 @@ class CertService(object):
             "parameters": {"client_id": client_id}
         })
 
-        del _server.next_method[client_id]
+        del _server.clients[client_id]
         return {"all_ok": True}
 
 
 def run_server(address):
-    with varlink.ThreadingServer(address, ServiceRequestHandler) as server:
+    with CertificationServer(address) as server:
         print("Listening on", server.server_address)
         try:
             server.serve_forever()
@@ -458,9 +418,12 @@ class TestService(unittest.TestCase):
                           + str(os.getpid()) \
                           + threading.current_thread().name
         else:
-            cls.address = "tcp:127.0.0.1:23456"
+            cls.address = "tcp:127.0.0.1:0"
 
-        cls.server = varlink.ThreadingServer(cls.address, ServiceRequestHandler)
+        cls.server = CertificationServer(cls.address)
+        if cls.address.startswith("tcp:"):
+            # the port the server got for port 0
+            cls.address = "tcp:%s:%d" % cls.server.server_address[:2]
         server_thread = threading.Thread(target=cls.server.serve_forever)
         server_thread.daemon = True
         server_thread.start()
@@ -0,0 +1,54 @@
+import unittest
+from types import SimpleNamespace
+
+import varlink
+
+
+class TestError(unittest.TestCase):
+    def test_new(self):
+        for error_class, parameter in ((varlink.InterfaceNotFound, 'interface'),
+                                       (varlink.MethodNotFound, 'method'),
+                                       (varlink.MethodNotImplemented, 'method'),
+                                       (varlink.InvalidParameter, 'parameter')):
+            e = varlink.VarlinkError.new({'error': 'org.varlink.service.' + error_class.__name__,
+                                          'parameters': {parameter: 'foo'}})
+            self.assertIsInstance(e, error_class)
+            self.assertEqual(e.parameters(), {parameter: 'foo'})
+
+            # namespaced clients pass the parameters of the message as they were decoded
+            for parameters in ({parameter: 'foo'}, SimpleNamespace(**{parameter: 'foo'})):
+                e = varlink.VarlinkError.new({'error': 'org.varlink.service.' + error_class.__name__,
+                                              'parameters': parameters}, True)
+                self.assertIsInstance(e, error_class)
+                self.assertEqual(e.parameters(), {parameter: 'foo'})
+
+            e = varlink.VarlinkError.new({'error': 'org.varlink.service.' + error_class.__name__}, True)
+            self.assertIsInstance(e, error_class)
+            self.assertEqual(e.parameters(), {parameter: None})
+
+        e = varlink.VarlinkError.new({'error': 'org.example.Failed', 'parameters': {'reason': 'foo'}})
+        self.assertIs(type(e), varlink.VarlinkError)
+        self.assertEqual(e.error(), 'org.example.Failed')
+
+    def test_normalize(self):
+        e = varlink.VarlinkError({'error': 'org.example.Failed',
+                                  'parameters': {'set': {'one'},
+                                                 'tuple': (1, 2),
+                                                 'ns': SimpleNamespace(a=[SimpleNamespace(b=True)]),
+                                                 'cause': varlink.InvalidParameter('foo')}})
+        self.assertEqual(e.as_dict(), {'error': 'org.example.Failed',
+                                       'parameters': {'set': {'one': {}},
+                                                      'tuple': [1, 2],
+                                                      'ns': {'a': [{'b': True}]},
+                                                      'cause': {'error': 'org.varlink.service.InvalidParameter',
+                                                                'parameters': {'parameter': 'foo'}}}})
+        self.assertIs(e.parameters(namespaced=True).ns.a[0].b, True)
+
+    def test_normalized_message_is_kept(self):
+        message = {'error': 'org.example.Failed', 'parameters': {'list': [1, 'two', None, 3.0, False]}}
+        self.assertIs(varlink.VarlinkError(message).as_dict(), message)
+
+        message = {'error': 'org.example.Failed', 'parameters': {'list': [{'tuple': (1, 2)}]}}
+        e = varlink.VarlinkError(message)
+        self.assertIsNot(e.as_dict(), message)
+        self.assertEqual(e.parameters(), {'list': [{'tuple': [1, 2]}]})
@@ -16,9 +16,6 @@ or::
 
 """
 
-from __future__ import print_function
-from __future__ import unicode_literals
-
 import argparse
 import os
 import shlex
@@ -30,14 +27,6 @@ import time
 import unittest
 from sys import platform
 
-try:
-    from builtins import int
-    from builtins import next
-    from builtins import object
-    from builtins import range
-except ImportError:
-    pass
-
 import varlink
 
 
@@ -237,10 +226,15 @@ if __name__ == '__main__':
 
 class TestService(unittest.TestCase):
     def test_service(self):
-        address = "tcp:127.0.0.1:23451"
         Example.sleep_duration = 0.1
 
-        server = varlink.ThreadingServer(address, ServiceRequestHandler)
+        if hasattr(socket, "AF_UNIX"):
+            address = "unix:org.example.more_" + str(os.getpid()) + threading.current_thread().name
+            server = varlink.ThreadingServer(address, ServiceRequestHandler)
+        else:
+            server = varlink.ThreadingServer("tcp:127.0.0.1:0", ServiceRequestHandler)
+            # the port the server got for port 0
+            address = "tcp:%s:%d" % server.server_address[:2]
         server_thread = threading.Thread(target=server.serve_forever)
         server_thread.daemon = True
         server_thread.start()
@@ -1,6 +1,3 @@
-from __future__ import print_function
-from __future__ import unicode_literals
-
 import unittest
 
 import varlink
@@ -84,6 +81,99 @@ error ActionFailed (reason: ?ErrorChain)
         self.assertIsInstance(interface.members.get("ErrorFoo"), varlink.scanner._Error)
         self.assertIsInstance(interface.members.get("TypeEnum"), varlink.scanner._Alias)
 
+    def test_resolved_types(self):
+        interface = varlink.Interface("""
+    interface org.example.resolved
+
+    type ErrorChain (
+        description: string,
+        caused_by: ?ErrorChain
+    )
+
+    type Chain ErrorChain
+
+    method Foo(chain: Chain, unknown: Unknown) -> ()
+    """)
+        chain = interface.members.get("ErrorChain").type
+        self.assertIs(interface.members.get("Chain").type, chain)
+        self.assertIs(chain.fields["caused_by"].element_type, chain)
+        self.assertIs(interface.get_method("Foo").in_type.fields["chain"], chain)
+        self.assertIsInstance(interface.get_method("Foo").in_type.fields["unknown"], varlink.scanner._CustomType)
+
+        self.assertEqual(interface.filter_params("test", interface.get_method("Foo").in_type, False,
+                                                 ({"description": "a", "caused_by": {"description": "b"}},), {}),
+                         {"chain": {"description": "a", "caused_by": {"description": "b"}}})
+        self.assertRaises(varlink.InvalidParameter, interface.filter_params, "test",
+                          interface.get_method("Foo").in_type, False, (None, "x"), {})
+
+        interface = varlink.Interface("""
+    interface org.example.loop
+
+    type A B
+    type B A
+
+    method Foo(a: ?A) -> ()
+    """)
+        self.assertRaises(varlink.InvalidParameter, interface.filter_params, "test",
+                          interface.get_method("Foo").in_type, False, (1,), {})
+
+    def test_float_to_int(self):
+        interface = varlink.Interface("""
+    interface org.example.round
+
+    method Foo(i: int) -> ()
+    """)
+        in_type = interface.get_method("Foo").in_type
+        self.assertEqual(interface.filter_params("test", in_type, False, (1.7,), {}), {"i": 2})
+        self.assertEqual(interface.filter_params("test", in_type, False, (-1.7,), {}), {"i": -2})
+        self.assertEqual(interface.filter_params("test", in_type, False, (3,), {}), {"i": 3})
+
+    def test_primitive_array(self):
+        interface = varlink.Interface("""
+    interface org.example.array
+
+    method Foo(i: []int, s: []string) -> ()
+    """)
+        in_type = interface.get_method("Foo").in_type
+        self.assertEqual(interface.filter_params("test", in_type, False, ([1, 2.2], ["a"]), {}),
+                         {"i": [1, 2], "s": ["a"]})
+        with self.assertRaises(varlink.InvalidParameter) as cm:
+            interface.filter_params("test", in_type, False, ([1], ["a", 2]), {})
+        self.assertEqual(cm.exception.parameters()["parameter"], "test.s[]")
+
+    def test_enum_values(self):
+        interface = varlink.Interface("""
+    interface org.example.enum
+
+    method Foo(e: (one, two)) -> ()
+    """)
+        in_type = interface.get_method("Foo").in_type
+        self.assertEqual(in_type.fields["e"].fields, ("one", "two"))
+        self.assertEqual(interface.filter_params("test", in_type, False, ("two",), {}), {"e": "two"})
+        self.assertRaises(varlink.InvalidParameter, interface.filter_params, "test", in_type, False, ("three",), {})
+
+    def test_parse_cached(self):
+        description = """
+    interface org.example.cached
+
+    method Foo(a: int) -> ()
+    """
+        interface = varlink.Interface.parse(description)
+        self.assertEqual(interface.name, "org.example.cached")
+        self.assertIs(varlink.Interface.parse(description), interface)
+        self.assertIsNot(varlink.Interface(description), interface)
+
+    def test_map_is_copied(self):
+        interface = varlink.Interface("""
+    interface org.example.map
+
+    method Foo(m: [string]int) -> ()
+    """)
+        m = {"a": 1.7}
+        self.assertEqual(interface.filter_params("test", interface.get_method("Foo").in_type, False, (m,), {}),
+                         {"m": {"a": 2}})
+        self.assertEqual(m, {"a": 1.7})
+
     def test_interfacename(self):
         self.assertRaises(SyntaxError, varlink.Interface, "interface .a.b.c\nmethod F()->()")
         self.assertRaises(SyntaxError, varlink.Interface, "interface com.-example.leadinghyphen\nmethod F()->()")
@@ -112,3 +202,30 @@ error ActionFailed (reason: ?ErrorChain)
         self.assertIsNotNone(varlink.Interface("interface com.example.example-dash\nmethod F()->()").name)
         self.assertIsNotNone(varlink.Interface("interface xn--lgbbat1ad8j.example.algeria\nmethod F()->()").name)
         self.assertIsNotNone(varlink.Interface("interface xn--c1yn36f.xn--c1yn36f.xn--c1yn36f\nmethod F()->()").name)
+
+    def test_build_field_filters(self):
+        interface = varlink.Interface("""
+    interface org.example.filters
+
+    type Chain (
+        description: string,
+        caused_by: ?Chain
+    )
+
+    method Foo(a: [](b: int), c: [string]Chain) -> (d: ?(e: bool))
+    """)
+        interface._build_field_filters()
+        foo = interface.get_method("Foo")
+        for struct in (foo.in_type, foo.in_type.fields["a"].element_type, interface.members["Chain"].type,
+                       foo.out_type, foo.out_type.fields["d"].element_type):
+            self.assertIsNotNone(struct._field_filters)
+
+    def test_method_signature(self):
+        interface = varlink.Interface("""
+    interface org.example.signature
+
+    method Foo(a: int) -> (b: string)
+    """)
+        foo = interface.get_method("Foo")
+        self.assertEqual(foo.signature, "Foo(a: int) -> (b: string)")
+        self.assertIs(foo.signature, foo.signature)